@@ -0,0 +1,4 @@
+from dotenv import load_dotenv
+
+# Load .env once for every API service instead of in each module
+load_dotenv()
@@ -0,0 +1,16 @@
+from functools import lru_cache
+from typing import Annotated
+from pydantic import AfterValidator, WithJsonSchema
+from pydantic.networks import validate_email
+
+@lru_cache(maxsize=10_000)
+def validate_email_cached(value: str) -> str:
+    """Validate and normalize an email address, memoized by the raw string"""
+    return validate_email(value)[1]
+
+# Drop-in replacement for EmailStr that skips email-validator for repeat addresses
+CachedEmailStr = Annotated[
+    str,
+    AfterValidator(validate_email_cached),
+    WithJsonSchema({"type": "string", "format": "email"}),
+]
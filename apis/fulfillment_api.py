@@ -1,18 +1,38 @@
 import os
-import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 import json
+import time
 import uuid
 from datetime import datetime
-from typing import Optional, List
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, EmailStr
-from dotenv import load_dotenv
+from enum import Enum
+from typing import Optional, List, Any
+import orjson
+from fastapi import FastAPI, HTTPException, Response, BackgroundTasks
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ValidationError
 import mongodb_manager
+import redis_cache
+from apis.email_types import CachedEmailStr
 import uvicorn
 
-load_dotenv()
+FULFILLMENT_CACHE_TTL = 60  # seconds
+PING_CACHE_SECONDS = 5
+MAIL_CONTENT_PREVIEW_CHARS = 256
+
+# Fixed health payload, serialized once at import
+_HEALTH_RESPONSE = Response(
+    content=orjson.dumps({"status": "healthy", "service": "fulfillment_api", "database": "mongodb"}),
+    media_type="application/json"
+)
+
+# Last MongoDB ping result, reused by GET / for PING_CACHE_SECONDS
+_last_ping_ts = 0.0
+_last_ping_ok = False
+
+class MongoJSONResponse(ORJSONResponse):
+    """orjson response that falls back to str() for ObjectIds and other BSON types"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=str)
 
 app = FastAPI()
 
@@ -26,33 +46,63 @@ async def lifespan(app: FastAPI):
     else:
         # Initialize collections with indexes
         mongodb_manager.initialize_collections()
+    await mongodb_manager.connect_async()
+    await redis_cache.connect_async()
     yield
     # Shutdown
+    await redis_cache.disconnect_async()
+    mongodb_manager.disconnect_async()
     mongodb_manager.disconnect()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=MongoJSONResponse)
+
+class FulfillmentStatus(str, Enum):
+    pending = "pending"
+    completed = "completed"
+    failed = "failed"
 
 class FulfillmentRequest(BaseModel):
-    user_mail: EmailStr
+    user_mail: CachedEmailStr
     claim_id: str
     mail_content: str
     mail_content_s3_url: Optional[str] = None
     attachment_count: int = 0
     attachment_s3_urls: Optional[List[str]] = None
     local_attachment_paths: Optional[List[str]] = None
-    fulfillment_status: str  # "pending" or "completed"
+    fulfillment_status: FulfillmentStatus
     missing_items: Optional[str] = None
     s3_upload_timestamp: Optional[str] = None
     # MongoDB GridFS file IDs
     mail_content_file_id: Optional[str] = None
     attachment_file_ids: Optional[List[str]] = None
 
+class FulfillmentBatchRequest(BaseModel):
+    # Validated one record at a time so a single bad record doesn't reject the whole batch
+    records: List[dict]
+
+def _mongodb_ping() -> bool:
+    """Ping MongoDB, reusing the previous result while it is fresh"""
+    global _last_ping_ts, _last_ping_ok
+    now = time.monotonic()
+    if now - _last_ping_ts < PING_CACHE_SECONDS:
+        return _last_ping_ok
+    _last_ping_ts = now
+    _last_ping_ok = False
+    if mongodb_manager.client:
+        _last_ping_ok = mongodb_manager.client.admin.command('ping').get('ok') == 1
+    return _last_ping_ok
+
 @app.get("/")
-def test_database_connection():
-    """Test database connection"""
+def test_database_connection(deep: bool = False):
+    """Test database connection (deep=1 fetches full server info instead of a cached ping)"""
     try:
         # Test MongoDB connection
-        if mongodb_manager.client and mongodb_manager.client.server_info():
+        if deep:
+            connected = bool(mongodb_manager.client and mongodb_manager.client.server_info())
+        else:
+            connected = _mongodb_ping()
+        
+        if connected:
             return {
                 "status": "success",
                 "database_connection": "successful",
@@ -74,58 +124,126 @@ def test_database_connection():
             "message": "MongoDB connection failed"
         }
 
+def build_request_data(data: FulfillmentRequest) -> dict:
+    """Turn a fulfillment request into the MongoDB document to insert"""
+    # Create fulfillment request data; the ID is generated here so we can ack before the insert
+    request_data = {
+        "_id": str(uuid.uuid4()),
+        "user_mail": data.user_mail,
+        "claim_id": data.claim_id,
+        "mail_content": data.mail_content,
+        "mail_content_file_id": data.mail_content_file_id,  # Use provided file ID
+        "attachment_count": data.attachment_count,
+        "attachment_file_ids": data.attachment_file_ids or [],  # Use provided file IDs
+        "local_attachment_paths": data.local_attachment_paths,
+        "fulfillment_status": data.fulfillment_status.value,
+        "missing_items": data.missing_items,
+        "s3_upload_timestamp": data.s3_upload_timestamp  # Legacy field kept for compatibility
+    }
+    
+    # Full body already lives in GridFS; keep only a short preview inline
+    if data.mail_content_file_id:
+        request_data["mail_content"] = None
+        request_data["mail_content_preview"] = data.mail_content[:MAIL_CONTENT_PREVIEW_CHARS]
+    
+    # If mail_content_s3_url is provided, store it as legacy reference
+    if data.mail_content_s3_url:
+        request_data["mail_content_s3_url"] = data.mail_content_s3_url
+    
+    # If attachment_s3_urls are provided, store them as legacy reference
+    if data.attachment_s3_urls:
+        request_data["attachment_s3_urls"] = data.attachment_s3_urls
+    
+    return request_data
+
+async def persist_fulfillment(request_data: dict):
+    """Insert a fulfillment request after the response has been sent"""
+    fulfillment_id = await mongodb_manager.create_fulfillment_request_async(request_data)
+    if fulfillment_id:
+        await redis_cache.delete_async(f"ff:{request_data['claim_id']}")
+    else:
+        # The client was already told the save succeeded, so leave a record for reconciliation
+        print(f"❌ Background save failed for claim {request_data['claim_id']}")
+        await mongodb_manager.record_failed_task_async("save_fulfillment", request_data['claim_id'], "background insert failed", request_data)
+
+async def persist_fulfillments(requests_data: List[dict]):
+    """Insert a batch of fulfillment requests after the response has been sent"""
+    stored = set(await mongodb_manager.create_fulfillment_requests_async(requests_data))
+    if stored:
+        await redis_cache.delete_async(*{f"ff:{request_data['claim_id']}" for request_data in requests_data if request_data["_id"] in stored})
+    if len(stored) != len(requests_data):
+        # The client was already told the saves succeeded, so leave a record for each lost one
+        print(f"❌ Background batch save stored {len(stored)} of {len(requests_data)} fulfillments")
+        for request_data in requests_data:
+            if request_data["_id"] not in stored:
+                await mongodb_manager.record_failed_task_async("save_fulfillment", request_data['claim_id'], "background batch insert failed", request_data)
+
 @app.post("/add-fulfillment")
-def add_fulfillment(data: FulfillmentRequest):
+async def add_fulfillment(data: FulfillmentRequest, background_tasks: BackgroundTasks):
     """Add fulfillment data to MongoDB"""
     try:
-        # Create fulfillment request data
-        request_data = {
-            "user_mail": data.user_mail,
-            "claim_id": data.claim_id,
-            "mail_content": data.mail_content,
-            "mail_content_file_id": data.mail_content_file_id,  # Use provided file ID
-            "attachment_count": data.attachment_count,
-            "attachment_file_ids": data.attachment_file_ids or [],  # Use provided file IDs
-            "local_attachment_paths": data.local_attachment_paths,
-            "fulfillment_status": data.fulfillment_status,
-            "missing_items": data.missing_items,
-            "s3_upload_timestamp": data.s3_upload_timestamp  # Legacy field kept for compatibility
-        }
+        request_data = build_request_data(data)
         
-        # If mail_content_s3_url is provided, store it as legacy reference
-        if data.mail_content_s3_url:
-            request_data["mail_content_s3_url"] = data.mail_content_s3_url
+        # Create fulfillment request in MongoDB once the response is sent
+        background_tasks.add_task(persist_fulfillment, request_data)
         
-        # If attachment_s3_urls are provided, store them as legacy reference
-        if data.attachment_s3_urls:
-            request_data["attachment_s3_urls"] = data.attachment_s3_urls
+        return {
+            "success": True,
+            "fulfillment_id": request_data["_id"],
+            "message": "Fulfillment data queued for saving in MongoDB"
+        }
         
-        # Create fulfillment request in MongoDB
-        fulfillment_id = mongodb_manager.create_fulfillment_request(request_data)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@app.post("/add-fulfillment-batch")
+async def add_fulfillment_batch(batch: FulfillmentBatchRequest, background_tasks: BackgroundTasks):
+    """Add several fulfillments to MongoDB with a single insert; invalid records get a None ID and an error entry"""
+    try:
+        requests_data = []
+        fulfillment_ids = []
+        errors = []
+        for index, record in enumerate(batch.records):
+            try:
+                data = FulfillmentRequest.model_validate(record)
+            except ValidationError as e:
+                fulfillment_ids.append(None)
+                errors.append({"index": index, "claim_id": record.get("claim_id"), "detail": e.errors(include_url=False)})
+                continue
+            request_data = build_request_data(data)
+            requests_data.append(request_data)
+            fulfillment_ids.append(request_data["_id"])
         
-        if fulfillment_id:
-            return {
-                "success": True,
-                "fulfillment_id": fulfillment_id,
-                "message": "Fulfillment data saved successfully in MongoDB"
-            }
-        else:
-            raise HTTPException(status_code=500, detail="Failed to save fulfillment data")
+        if requests_data:
+            background_tasks.add_task(persist_fulfillments, requests_data)
+        
+        return {
+            "success": not errors,
+            "fulfillment_ids": fulfillment_ids,
+            "errors": errors,
+            "message": f"{len(requests_data)} fulfillments queued for saving in MongoDB, {len(errors)} rejected"
+        }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.get("/fulfillment/{claim_id}")
-def get_fulfillment(claim_id: str):
+async def get_fulfillment(claim_id: str):
     """Get fulfillment request by claim ID"""
     try:
-        fulfillment = mongodb_manager.get_fulfillment_request(claim_id)
+        cache_key = f"ff:{claim_id}"
+        fulfillment = await redis_cache.get_json_async(cache_key)
+        if not fulfillment:
+            fulfillment = await mongodb_manager.get_fulfillment_request_async(claim_id)
+            if fulfillment:
+                await redis_cache.set_json_async(cache_key, fulfillment, FULFILLMENT_CACHE_TTL)
         
         if fulfillment:
-            return {
+            # Returned directly so the Mongo document skips jsonable_encoder
+            return MongoJSONResponse({
                 "success": True,
                 "data": fulfillment
-            }
+            })
         else:
             return {
                 "success": False,
@@ -135,19 +253,43 @@ def get_fulfillment(claim_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+@app.get("/fulfillment/{claim_id}/mail-content")
+def get_fulfillment_mail_content(claim_id: str):
+    """Get the full mail content for a fulfillment request from GridFS"""
+    try:
+        fulfillment = mongodb_manager.get_fulfillment_request(
+            claim_id, {"mail_content_file_id": 1, "mail_content": 1}
+        )
+        if not fulfillment:
+            raise HTTPException(status_code=404, detail=f"Fulfillment with claim_id {claim_id} not found")
+        
+        file_id = fulfillment.get("mail_content_file_id")
+        if not file_id:
+            # Older documents store the body inline
+            return {"success": True, "data": {"content": fulfillment.get("mail_content")}}
+        
+        mail_bytes = mongodb_manager.download_file(file_id)
+        if mail_bytes is None:
+            raise HTTPException(status_code=404, detail=f"Mail content file {file_id} not found")
+        
+        return {"success": True, "data": json.loads(mail_bytes)}
+        
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
 @app.put("/fulfillment/{claim_id}/status")
-def update_fulfillment_status(claim_id: str, status: str):
+async def update_fulfillment_status(claim_id: str, status: FulfillmentStatus):
     """Update fulfillment status"""
     try:
-        if status not in ["pending", "completed", "failed"]:
-            raise HTTPException(status_code=400, detail="Invalid status. Must be 'pending', 'completed', or 'failed'")
-        
-        success = mongodb_manager.update_fulfillment_request(claim_id, {"fulfillment_status": status})
+        success = await mongodb_manager.update_fulfillment_request_async(claim_id, {"fulfillment_status": status.value})
         
         if success:
+            await redis_cache.delete_async(f"ff:{claim_id}")
             return {
                 "success": True,
-                "message": f"Fulfillment status updated to {status}"
+                "message": f"Fulfillment status updated to {status.value}"
             }
         else:
             return {
@@ -161,9 +303,17 @@ def update_fulfillment_status(claim_id: str, status: str):
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.get("/health")
-def health_check():
+async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "fulfillment_api", "database": "mongodb"}
+    return _HEALTH_RESPONSE
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8002) 
\ No newline at end of file
+    uvicorn.run(
+        "apis.fulfillment_api:app",
+        host="0.0.0.0",
+        port=8002,
+        workers=int(os.getenv("API_WORKERS", os.cpu_count() or 1)),
+        loop="auto",  # uvloop when installed (uvicorn[standard]), asyncio on Windows
+        http="auto",  # httptools when installed, h11 otherwise
+        log_level="warning"
+    )
@@ -1,44 +1,145 @@
 import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, EmailStr
-from dotenv import load_dotenv
+import asyncio
+import aiosmtplib
+import orjson
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.utils import formataddr
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel
+from apis.email_types import CachedEmailStr
 import uvicorn
 
-load_dotenv()
-
-app = FastAPI()
-
 # Email configuration
 USERNAME = os.getenv("EMAIL_USERNAME")
 APP_PASSWORD = os.getenv("EMAIL_APP_PASSWORD")
 SMTP_SERVER = "smtp.gmail.com"
 SMTP_PORT = 587
+# From header is constant, so encode it once
+_FROM_HEADER = formataddr((None, USERNAME)) if USERNAME else None
+
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "5"))
+MAX_MSGS_PER_CONN = 100
+
+# Fixed root payload, serialized once at import
+_ROOT_RESPONSE = Response(content=orjson.dumps({"status": "running"}), media_type="application/json")
+
+class SmtpPool:
+    """Bounded pool of authenticated async SMTP sessions shared across requests"""
+
+    def __init__(self, maxsize: int, max_messages_per_conn: int):
+        self._idle = asyncio.Queue(maxsize=maxsize)
+        self._slots = asyncio.BoundedSemaphore(maxsize)
+        self.max_messages_per_conn = max_messages_per_conn
+
+    async def _create(self) -> aiosmtplib.SMTP:
+        """Open and authenticate a new SMTP session"""
+        server = aiosmtplib.SMTP(hostname=SMTP_SERVER, port=SMTP_PORT, start_tls=False)
+        await server.connect()
+        await server.starttls()
+        await server.login(USERNAME, APP_PASSWORD)
+        server.sent_count = 0
+        return server
+
+    @staticmethod
+    async def _discard(server: aiosmtplib.SMTP):
+        try:
+            await server.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            server.close()
+
+    async def get(self) -> aiosmtplib.SMTP:
+        """Check out a live session, waiting while all sessions are in use"""
+        await self._slots.acquire()
+        try:
+            try:
+                server = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                return await self._create()
+            try:
+                await server.noop()
+                return server
+            except (aiosmtplib.SMTPException, OSError):
+                await self._discard(server)
+                return await self._create()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def put(self, server: aiosmtplib.SMTP, healthy: bool = True):
+        """Return a session to the pool, rotating it once it has sent enough messages"""
+        try:
+            if healthy and server.is_connected and server.sent_count < self.max_messages_per_conn:
+                self._idle.put_nowait(server)
+            else:
+                await self._discard(server)
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def acquire(self):
+        server = await self.get()
+        healthy = True
+        try:
+            yield server
+            server.sent_count += 1
+        except (aiosmtplib.SMTPServerDisconnected, OSError):
+            healthy = False
+            raise
+        finally:
+            await self.put(server, healthy)
+
+    async def warm_up(self):
+        """Open one session up front so the first request skips the TLS + AUTH handshake"""
+        async with self.acquire():
+            pass
+
+    async def close(self):
+        """Quit all idle sessions"""
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            await self._discard(server)
+
+smtp_pool = SmtpPool(SMTP_POOL_SIZE, MAX_MSGS_PER_CONN)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    if USERNAME and APP_PASSWORD:
+        try:
+            await smtp_pool.warm_up()
+        except Exception as e:
+            print(f"⚠️ Failed to open SMTP session: {e}")
+    yield
+    # Shutdown
+    await smtp_pool.close()
+
+app = FastAPI(lifespan=lifespan)
 
 class MailRequest(BaseModel):
-    mail_id: EmailStr
+    mail_id: CachedEmailStr
     subject: str
     mail_content: str
 
-def send_email(to_email: str, subject: str, content: str):
+async def send_email(to_email: str, subject: str, content: str):
     """Send email using SMTP"""
     try:
         if not USERNAME or not APP_PASSWORD:
             raise Exception("Email credentials not configured")
         
-        msg = MIMEMultipart()
-        msg['From'] = USERNAME
+        msg = EmailMessage()
+        msg['From'] = _FROM_HEADER
         msg['To'] = to_email
         msg['Subject'] = subject
-        msg.attach(MIMEText(content, 'plain'))
+        msg.set_content(content)
         
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(USERNAME, APP_PASSWORD)
-        server.sendmail(USERNAME, to_email, msg.as_string())
-        server.quit()
+        # No RFC 2920 pipelining here: aiosmtplib waits for the MAIL, RCPT and DATA replies in turn, and its
+        # protocol drops replies that arrive before the previous one is read, so back-to-back writes are unsafe
+        async with smtp_pool.acquire() as server:
+            await server.send_message(msg)
         
         return True
         
@@ -46,14 +147,14 @@ def send_email(to_email: str, subject: str, content: str):
         raise e
 
 @app.get("/")
-def read_root():
-    return {"status": "running"}
+async def read_root():
+    return _ROOT_RESPONSE
 
 @app.post("/send-mail")
-def send_mail(mail_request: MailRequest):
+async def send_mail(mail_request: MailRequest):
     """Send email to specified recipient"""
     try:
-        send_email(
+        await send_email(
             to_email=mail_request.mail_id,
             subject=mail_request.subject,
             content=mail_request.mail_content
@@ -66,4 +167,12 @@ def send_mail(mail_request: MailRequest):
 
 
 if __name__ == "__main__":
-    uvicorn.run("mail_service:app", host="0.0.0.0", port=8001, reload=True) 
\ No newline at end of file
+    uvicorn.run(
+        "apis.mail_service:app",
+        host="0.0.0.0",
+        port=8001,
+        workers=int(os.getenv("API_WORKERS", os.cpu_count() or 1)),
+        loop="auto",  # uvloop when installed (uvicorn[standard]), asyncio on Windows
+        http="auto",  # httptools when installed, h11 otherwise
+        log_level="warning"
+    )
@@ -1,14 +1,20 @@
 import os
-import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from fastapi import FastAPI, HTTPException
+import orjson
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.responses import JSONResponse
-from dotenv import load_dotenv
 import mongodb_manager
+import redis_cache
 import uvicorn
 
-load_dotenv()
+USER_CACHE_TTL = 300  # seconds
+USERS_BLOOM_ERROR_RATE = 0.001
+USERS_BLOOM_CAPACITY = 100000
+
+# Fixed health payload, serialized once at import
+_HEALTH_RESPONSE = Response(
+    content=orjson.dumps({"status": "healthy", "service": "user_validator", "database": "mongodb"}),
+    media_type="application/json"
+)
 
 from contextlib import asynccontextmanager
 
@@ -17,21 +23,51 @@ async def lifespan(app: FastAPI):
     # Startup
     if not mongodb_manager.connect():
         print("⚠️ Failed to connect to MongoDB")
+    if redis_cache.connect():
+        seed_user_bloom_filter()
     yield
     # Shutdown
+    redis_cache.disconnect()
     mongodb_manager.disconnect()
 
 app = FastAPI(lifespan=lifespan)
 
+def seed_user_bloom_filter():
+    """Create the users Bloom filter and load every registered email into it"""
+    # The filter lives in Redis, so only the worker that creates it scans the users collection
+    if redis_cache.bloom_reserve(redis_cache.USERS_BLOOM_KEY, USERS_BLOOM_ERROR_RATE, USERS_BLOOM_CAPACITY):
+        emails = mongodb_manager.get_all_user_emails()
+        if not emails or redis_cache.bloom_add(redis_cache.USERS_BLOOM_KEY, *emails):
+            redis_cache.bloom_mark_ready(redis_cache.USERS_BLOOM_KEY)
+            print(f"✅ Users Bloom filter seeded with {len(emails)} emails")
+
 def get_user_by_email(email: str):
-    """Get user details by email from MongoDB"""
+    """Get user details by email, served from Redis when cached"""
     try:
+        cache_key = f"user:{email}"
+        
+        # Unknown senders are ruled out without touching MongoDB; create_user adds new emails
+        # to the filter, and until it is fully seeded every lookup falls through to MongoDB
+        if not redis_cache.bloom_might_contain(redis_cache.USERS_BLOOM_KEY, email):
+            return None
+        
+        user = redis_cache.get_json(cache_key)
+        if user:
+            return user
+        
         user = mongodb_manager.get_user_by_email(email)
         
-        if user and 'policy_issued_date' in user:
-            # Convert date to string format if it's a datetime object
-            if hasattr(user['policy_issued_date'], 'strftime'):
-                user['policy_issued_date'] = user['policy_issued_date'].strftime('%Y-%m-%d')
+        if not user:
+            return None
+        
+        if 'policy_issued_date_str' in user:
+            # Date is formatted at write time; expose it under the original field name
+            user['policy_issued_date'] = user.pop('policy_issued_date_str')
+        elif hasattr(user.get('policy_issued_date'), 'strftime'):
+            # Users inserted without the pre-formatted field (e.g. directly into MongoDB)
+            user['policy_issued_date'] = user['policy_issued_date'].strftime('%Y-%m-%d')
+        
+        redis_cache.set_json(cache_key, user, USER_CACHE_TTL)
         
         return user
         
@@ -64,9 +100,17 @@ def get_user_details(user_email: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/health")
-def health_check():
+async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "user_validator", "database": "mongodb"}
+    return _HEALTH_RESPONSE
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(
+        "apis.user_validator:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("API_WORKERS", os.cpu_count() or 1)),
+        loop="auto",  # uvloop when installed (uvicorn[standard]), asyncio on Windows
+        http="auto",  # httptools when installed, h11 otherwise
+        log_level="warning"
+    )
@@ -0,0 +1,34 @@
+import os
+import sys
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+# Level for the pipeline loggers (DEBUG, INFO, WARNING, ...)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Records are queued by the calling thread and written to stdout by one listener thread
+_log_queue = queue.SimpleQueue()
+_listener = None
+
+def _start_listener():
+    """Start the background writer the first time a logger is requested"""
+    global _listener
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    _listener = QueueListener(_log_queue, handler)
+    _listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(_listener.stop)
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a logger whose records are written off the calling thread"""
+    if _listener is None:
+        _start_listener()
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        logger.addHandler(QueueHandler(_log_queue))
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+    return logger
@@ -23,19 +23,31 @@ import os
 import imaplib
 import email
 import ssl
+import string
 import time
+import select
+import signal
+import re
 import uuid
+import binascii
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
-from queue import Queue
-from threading import Lock
-from email.header import decode_header
+from functools import lru_cache
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.header import decode_header, make_header
+from email.utils import parseaddr
 from dotenv import load_dotenv
 import fulfillment_processor
 import mongodb_manager
+from log_queue import get_logger
 
 load_dotenv()
 
+log = get_logger("mail_monitor")
+
 # Global configuration
 USERNAME = os.getenv("EMAIL_USERNAME")
 APP_PASSWORD = os.getenv("EMAIL_APP_PASSWORD")
@@ -44,21 +56,80 @@ IMAP_PORT = 993
 FASTAPI_BASE_URL = os.getenv('FASTAPI_BASE_URL', 'http://localhost:8000')
 MAIL_SERVICE_URL = os.getenv('MAIL_SERVICE_URL', 'http://localhost:8001')
 PROMPTS_FOLDER = os.path.join(os.path.dirname(__file__), 'prompts')
+LOCAL_ATTACHMENTS_FOLDER = os.getenv('LOCAL_ATTACHMENTS_FOLDER', 'attachments')
+FETCH_BATCH_SIZE = int(os.getenv('IMAP_FETCH_BATCH_SIZE', '25'))  # messages per IMAP FETCH round trip
+PREVIEW_BYTES = int(os.getenv('IMAP_PREVIEW_BYTES', '65536'))  # body bytes fetched for LLM filtering
+FILTER_WORKERS = int(os.getenv('FILTER_WORKERS', '8'))  # concurrent Bedrock triage calls per fetch (the only LLM fan-out)
+ATTACHMENT_DECODE_CHUNK = 64 * 1024  # base64 characters decoded per write
+ATTACHMENT_WRITE_BUFFER = 1024 * 1024
+ATTACHMENT_WRITERS = 4  # threads writing attachments while the IMAP fetch continues
+PROCESS_RATE = float(os.getenv('PROCESS_RATE_PER_SECOND', '1'))  # sustained emails/second sent to fulfillment
+PROCESS_BURST = int(os.getenv('PROCESS_BURST', '10'))  # emails processed back to back before throttling
+POLL_INTERVAL = 30  # seconds between checks when the server doesn't support IDLE
+# Longest single IDLE wait; RFC 2177 asks clients to re-issue IDLE at least every 29 minutes
+IDLE_TIMEOUT = int(os.getenv('IMAP_IDLE_TIMEOUT', '300'))
+
+# Start of a message in a FETCH response, and attachment dispositions inside its BODYSTRUCTURE
+_FETCH_START_RE = re.compile(rb'^(\d+) \(')
+_ATTACHMENT_DISPOSITION_RE = re.compile(rb'\("attachment"', re.IGNORECASE)
+_ATTACHMENT_FILENAME_RE = re.compile(rb'\("attachment" \([^)]*?"filename\*?" "([^"]*)"', re.IGNORECASE)
+# Untagged mailbox-size updates seen while idling, and the MESSAGES item of a STATUS reply
+_EXISTS_RE = re.compile(rb'^\* (\d+) EXISTS')
+_STATUS_MESSAGES_RE = re.compile(rb'MESSAGES (\d+)')
+
+# Keep-alive session shared by the user validator and mail service calls
+_SESSION = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.1)
+)
+_SESSION.mount("http://", _HTTP_ADAPTER)
+_SESSION.mount("https://", _HTTP_ADAPTER)
 
 # Global state
 mail_connection = None
-email_queue = Queue()
-queue_lock = Lock()
+# Inbox size last reported by the server; None when an expunge left it unknown
+inbox_count = None
+# Single producer (fetch) and single consumer (process); deque append/popleft are atomic
+email_queue = deque()
         
-def load_prompt_file(filename):
-    """Load content from prompt file"""
+@lru_cache(maxsize=16)
+def _read_email_template(filename):
+    """Read a mail template once, split off its 'Subject: ' line and pre-parse its placeholders; failures raise and are not cached"""
+    file_path = os.path.join(PROMPTS_FOLDER, filename)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        lines = f.read().strip().split('\n')
+    
+    subject = lines[0].replace('Subject: ', '') if lines[0].startswith('Subject: ') else None
+    
+    # Get content after subject line and empty line
+    content_start = 2 if len(lines) > 1 and lines[1] == '' else 1
+    content = '\n'.join(lines[content_start:])
+    
+    # (literal text, placeholder, format spec) segments, so rendering skips re-parsing the format string
+    segments = tuple((literal, field, spec) for literal, field, spec, _ in string.Formatter().parse(content))
+    return subject, segments
+
+def render_email_template(segments, **values):
+    """Fill a pre-parsed template's placeholders, like str.format"""
+    return ''.join(
+        literal if field is None else literal + format(values[field], spec)
+        for literal, field, spec in segments
+    )
+
+def load_email_template(filename):
+    """Load (subject, pre-parsed content) from a mail template file, or None if it can't be read"""
     try:
-        file_path = os.path.join(PROMPTS_FOLDER, filename)
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read().strip()
+        return _read_email_template(filename)
     except Exception as e:
-        print(f"❌ Error loading prompt file {filename}: {e}")
+        log.error("❌ Error loading prompt file %s: %s", filename, e)
         return None
+
+def invalidate_prompt_cache():
+    """Drop cached templates and prompts so edits on disk are picked up"""
+    _read_email_template.cache_clear()
+    fulfillment_processor.invalidate_prompt_cache()
         
 
 def connect_to_database():
@@ -66,92 +137,89 @@ def connect_to_database():
     try:
         if mongodb_manager.connect():
             mongodb_manager.initialize_collections()
-            print("✅ MongoDB connection established")
+            log.info("✅ MongoDB connection established")
             return True
         else:
-            print("❌ MongoDB connection failed")
+            log.error("❌ MongoDB connection failed")
             return False
     except Exception as e:
-        print(f"❌ Database connection failed: {e}")
+        log.error("❌ Database connection failed: %s", e)
         return False
     
 
 def connect_to_mail_server():
     """Connect to Gmail IMAP server"""
-    global mail_connection
+    global mail_connection, inbox_count
     try:
         context = ssl.create_default_context()
         mail_connection = imaplib.IMAP4_SSL(IMAP_SERVER, IMAP_PORT, ssl_context=context)
         mail_connection.login(USERNAME, APP_PASSWORD)
             
+        # The inbox stays selected for the life of the connection
         status, messages = mail_connection.select("inbox")
         if status != 'OK':
-            print("❌ Failed to select inbox")
+            log.error("❌ Failed to select inbox")
             return False
+        inbox_count = int(messages[0])
             
-        print("✅ Mail server connection established")
+        log.info("✅ Mail server connection established")
         return True
     except Exception as e:
-        print(f"❌ Mail server connection failed: {e}")
+        log.error("❌ Mail server connection failed: %s", e)
         return False
     
 
 def check_user_registration(email_address):
     """Check if user is registered using FastAPI endpoint"""
     try:
-        print(f"🔍 Checking user registration for: {email_address}")
+        log.info("🔍 Checking user registration for: %s", email_address)
         
         # Call FastAPI endpoint
-        response = requests.get(f"{FASTAPI_BASE_URL}/user/{email_address}", timeout=10)
+        response = _SESSION.get(f"{FASTAPI_BASE_URL}/user/{email_address}", timeout=10)
         
         if response.status_code == 200:
             data = response.json()
             if data.get('status') == 'success':
                 user_data = data.get('user', {})
-                print(f"✅ User registered - ID: {user_data.get('_id')}, Policy: {user_data.get('policy_type')}")
+                log.info("✅ User registered - ID: %s, Policy: %s", user_data.get('_id'), user_data.get('policy_type'))
                 return True, user_data
             else:
-                print(f"❌ User not registered: {data.get('message', 'User not found')}")
+                log.info("❌ User not registered: %s", data.get('message', 'User not found'))
                 return False, None
         else:
-            print(f"❌ API call failed with status {response.status_code}")
+            log.error("❌ API call failed with status %s", response.status_code)
             return False, None
                 
     except requests.exceptions.RequestException as e:
-        print(f"❌ Error calling user registration API: {e}")
+        log.error("❌ Error calling user registration API: %s", e)
         return False, None
     except Exception as e:
-        print(f"❌ Unexpected error during user check: {e}")
+        log.error("❌ Unexpected error during user check: %s", e)
         return False, None
     
 
 def send_unregistered_user_email_via_service(to_email, claim_id):
     """Send email to unregistered user via mail service"""
     try:
-        # Load email template from file
-        email_template = load_prompt_file('user_not_found_email.txt')
+        # Load email template from file (already split into subject and content)
+        email_template = load_email_template('user_not_found_email.txt')
         
         if not email_template:
             # Try fallback template
-            email_template = load_prompt_file('user_not_found_fallback.txt')
+            email_template = load_email_template('user_not_found_fallback.txt')
         
         if email_template:
-            # Parse subject and content from template
-            lines = email_template.split('\n')
-            subject = lines[0].replace('Subject: ', '') if lines[0].startswith('Subject: ') else "Insurance Claim - Registration Required"
-            
-            # Get content after subject line and empty line
-            content_start = 2 if len(lines) > 1 and lines[1] == '' else 1
-            email_content = '\n'.join(lines[content_start:])
+            subject, segments = email_template
+            subject = subject or "Insurance Claim - Registration Required"
             
             # Format template with variables
-            email_content = email_content.format(claim_id=claim_id, user_email=to_email)
+            email_content = render_email_template(segments, claim_id=claim_id, user_email=to_email)
         else:
             # Last resort: minimal fallback
             subject = "Insurance Claim - Registration Required"
             email_content = f"Dear Customer,\n\nYour email {to_email} is not registered in our system.\n\nClaim Reference: {claim_id}\n\nPlease contact customer service.\n\nBest regards,\nInsurance Claims Team"
         
-        print(f"📧 Sending unregistered user email via mail service to: {to_email}")
+        log.info("📧 Sending unregistered user email via mail service to: %s", to_email)
         
         mail_request = {
             "mail_id": to_email,
@@ -159,38 +227,120 @@ def send_unregistered_user_email_via_service(to_email, claim_id):
             "mail_content": email_content
         }
         
-        response = requests.post(
+        response = _SESSION.post(
             f"{MAIL_SERVICE_URL}/send-mail",
             json=mail_request,
             timeout=30
         )
         
         if response.status_code == 200:
-            print(f"✅ Unregistered user notification sent via mail service to {to_email}")
+            log.info("✅ Unregistered user notification sent via mail service to %s", to_email)
             return True
         else:
-            print(f"❌ Mail service failed with status {response.status_code}: {response.text}")
+            log.error("❌ Mail service failed with status %s: %s", response.status_code, response.text)
             return False
             
     except requests.exceptions.RequestException as e:
-        print(f"❌ Error calling mail service: {e}")
+        log.error("❌ Error calling mail service: %s", e)
         return False
     except Exception as e:
-        print(f"❌ Error sending unregistered user email: {e}")
+        log.error("❌ Error sending unregistered user email: %s", e)
         return False
     
+def _track_mailbox_update(line):
+    """Keep inbox_count in step with an untagged EXISTS/EXPUNGE line; True if it was EXISTS"""
+    global inbox_count
+    match = _EXISTS_RE.match(line)
+    if match:
+        inbox_count = int(match.group(1))
+        return True
+    if line.rstrip().endswith(b'EXPUNGE'):
+        inbox_count = None
+    return False
+
+def _response_buffered():
+    """True if a response is already readable without blocking: in imaplib's buffer or the TLS layer"""
+    sock = mail_connection.sock
+    previous_timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        # peek() returns buffered bytes as-is and only falls through to one non-blocking read when empty
+        return bool(mail_connection.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        sock.settimeout(previous_timeout)
+
+def wait_for_new_mail(timeout):
+    """Block in IMAP IDLE until the server reports new mail or timeout passes; False if IDLE isn't usable"""
+    global mail_connection
+    if 'IDLE' not in mail_connection.capabilities:
+        return False
+    
+    try:
+        tag = mail_connection._new_tag()
+        mail_connection.send(tag + b' IDLE\r\n')
+        response = mail_connection.readline()
+        if not response.startswith(b'+'):
+            log.warning("⚠️ Server rejected IDLE: %r", response)
+            return False
+        
+        new_mail = False
+        deadline = time.monotonic() + timeout
+        try:
+            while not new_mail:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # select() can't see bytes imaplib or TLS already buffered (e.g. EXISTS read with "+ idling")
+                if not _response_buffered():
+                    readable, _, _ = select.select([mail_connection.sock], [], [], remaining)
+                    if not readable:
+                        break
+                line = mail_connection.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("connection closed during IDLE")
+                new_mail = _track_mailbox_update(line)
+        finally:
+            mail_connection.send(b'DONE\r\n')
+            # Drain untagged responses until the IDLE command completes
+            while True:
+                line = mail_connection.readline()
+                if not line or line.startswith(tag):
+                    break
+                _track_mailbox_update(line)
+        return True
+    except (imaplib.IMAP4.error, OSError) as e:
+        log.warning("⚠️ IMAP IDLE failed, falling back to polling: %s", e)
+        return False
+
 def get_current_mail_count():
     """Get current mail count from mail server"""
-    global mail_connection
+    global mail_connection, inbox_count
     try:
-        status, messages = mail_connection.select("inbox")
-        if status == 'OK':
-            mail_count = int(messages[0])
-            print(f"📧 Current mail count: {mail_count}")
-            return mail_count
-        return 0
+        # NOOP lets the server push EXISTS/EXPUNGE updates without re-opening the mailbox
+        status, _ = mail_connection.noop()
+        if status != 'OK':
+            return 0
+        
+        _, expunged = mail_connection.response('EXPUNGE')
+        _, exists = mail_connection.response('EXISTS')
+        if expunged[-1] is not None:
+            # Expunges shrink the mailbox without an EXISTS, so ask for the size outright
+            inbox_count = None
+        elif exists[-1] is not None:
+            inbox_count = int(exists[-1])
+        
+        if inbox_count is None:
+            status, data = mail_connection.status('inbox', '(MESSAGES)')
+            if status != 'OK':
+                return 0
+            inbox_count = int(_STATUS_MESSAGES_RE.search(data[0]).group(1))
+        
+        log.info("📧 Current mail count: %s", inbox_count)
+        return inbox_count
     except Exception as e:
-        print(f"❌ Error getting mail count: {e}")
+        log.error("❌ Error getting mail count: %s", e)
         return 0
     
 def get_stored_mail_details():
@@ -199,13 +349,13 @@ def get_stored_mail_details():
         result = mongodb_manager.get_last_mail_details()
         
         if result:
-            print(f"📊 Stored mail details - Count: {result['mail_count']}, Last connection: {result['last_connection_time']}")
+            log.info("📊 Stored mail details - Count: %s, Last connection: %s", result['mail_count'], result['last_connection_time'])
             return result['mail_count'], result['last_connection_time']
         else:
-            print("📊 No previous mail details found in database")
+            log.info("📊 No previous mail details found in database")
             return 0, None
     except Exception as e:
-        print(f"❌ Error getting stored mail details: {e}")
+        log.error("❌ Error getting stored mail details: %s", e)
         return 0, None
     
 def update_mail_details(mail_count):
@@ -215,87 +365,174 @@ def update_mail_details(mail_count):
         success = mongodb_manager.update_mail_tracking(mail_count, current_time)
         
         if success:
-            print(f"✅ Updated database - Mail count: {mail_count}, Time: {current_time}")
+            log.info("✅ Updated database - Mail count: %s, Time: %s", mail_count, current_time)
             return True
         else:
-            print(f"❌ Failed to update mail details in MongoDB")
+            log.error("❌ Failed to update mail details in MongoDB")
             return False
     except Exception as e:
-        print(f"❌ Error updating mail details: {e}")
+        log.error("❌ Error updating mail details: %s", e)
         return False
     
-def process_email_attachments(msg, claim_id):
-        """Extract and save email attachments"""
-        attachment_paths = []
-        save_path = os.getenv('LOCAL_ATTACHMENTS_FOLDER', 'attachments')
+def write_attachment_payload(part, file_path):
+    """Write an attachment to disk, decoding base64 bodies in chunks instead of all at once"""
+    encoding = str(part.get('Content-Transfer-Encoding', '')).strip().lower()
+    with open(file_path, "wb", buffering=ATTACHMENT_WRITE_BUFFER) as f:
+        if encoding != 'base64':
+            f.write(part.get_payload(decode=True))
+            return
         
-        # Create claim-specific folder
-        claim_folder = os.path.join(save_path, claim_id)
-        if not os.path.exists(claim_folder):
-            os.makedirs(claim_folder)
-            print(f"📁 Created folder: {claim_folder}")
-        
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_disposition = str(part.get('Content-Disposition'))
-                
-                if "attachment" in content_disposition:
-                    filename = part.get_filename()
-                    if filename:
-                        try:
-                            # Decode filename if encoded
-                            decoded_filename, charset = decode_header(filename)[0]
-                            if charset:
-                                filename = decoded_filename.decode(charset)
-                            else:
-                                filename = str(decoded_filename)
-                            
-                            # Create unique filename with timestamp
-                            timestamp = str(int(time.time() * 1000))
-                            unique_filename = f"{timestamp}_{filename}"
-                            file_path = os.path.join(claim_folder, unique_filename)
-                            
-                            # Save attachment
-                            with open(file_path, "wb") as f:
-                                f.write(part.get_payload(decode=True))
-                            
-                            attachment_paths.append(file_path)
-                            print(f"📎 Saved attachment: {unique_filename}")
-                            
-                        except Exception as e:
-                            print(f"❌ Error saving attachment {filename}: {e}")
-        
-        return attachment_paths
-    
-def extract_email_content(msg):
-        """Extract email content from message"""
-        email_content = "No content found"
+        payload = part.get_payload(decode=False)
+        leftover = ''
+        for start in range(0, len(payload), ATTACHMENT_DECODE_CHUNK):
+            # Drop line breaks and decode whole 4-character groups, carrying the rest over
+            chunk = leftover + ''.join(payload[start:start + ATTACHMENT_DECODE_CHUNK].split())
+            usable = len(chunk) - len(chunk) % 4
+            f.write(binascii.a2b_base64(chunk[:usable]))
+            leftover = chunk[usable:]
+        if leftover:
+            f.write(binascii.a2b_base64(leftover + '=' * (-len(leftover) % 4)))
+
+def parse_email_parts(msg):
+        """Walk the MIME tree once, returning the text content and the attachment parts"""
+        email_content = None
+        attachment_parts = []
         
         if msg.is_multipart():
             for part in msg.walk():
-                content_type = part.get_content_type()
                 content_disposition = str(part.get('Content-Disposition'))
                 
-                if content_type == 'text/plain' and 'attachment' not in content_disposition:
+                if 'attachment' in content_disposition:
+                    attachment_parts.append(part)
+                elif email_content is None and part.get_content_type() == 'text/plain':
                     payload = part.get_payload(decode=True)
                     if payload:
                         email_content = payload.decode('utf-8', errors='ignore')
-                        break
         else:
             payload = msg.get_payload(decode=True)
             if payload:
                 email_content = payload.decode('utf-8', errors='ignore')
         
-        return email_content
+        return email_content or "No content found", attachment_parts
     
+# Attachment writes run here so disk I/O overlaps with the next IMAP fetch
+_attachment_executor = ThreadPoolExecutor(max_workers=ATTACHMENT_WRITERS, thread_name_prefix="attachment-writer")
+
+def write_attachments(attachment_parts, claim_id):
+        """Queue attachment parts for saving under the claim's folder; returns (path, future) pairs"""
+        pending_writes = []
+        
+        # Claim-specific folder, created when the first attachment is written
+        claim_folder = os.path.join(LOCAL_ATTACHMENTS_FOLDER, claim_id)
+        folder_created = False
+        
+        for part in attachment_parts:
+            filename = part.get_filename()
+            if filename:
+                try:
+                    # Decode filename if encoded
+                    decoded_filename, charset = decode_header(filename)[0]
+                    if charset:
+                        filename = decoded_filename.decode(charset)
+                    else:
+                        filename = str(decoded_filename)
+                    
+                    # Create unique filename with timestamp
+                    timestamp = str(time.time_ns())
+                    unique_filename = f"{timestamp}_{filename}"
+                    file_path = os.path.join(claim_folder, unique_filename)
+                    
+                    # Create claim-specific folder
+                    if not folder_created:
+                        os.makedirs(claim_folder, exist_ok=True)
+                        log.debug("📁 Created folder: %s", claim_folder)
+                        folder_created = True
+                    
+                    # Save attachment in the background
+                    pending_writes.append((file_path, _attachment_executor.submit(write_attachment_payload, part, file_path)))
+                    
+                except Exception as e:
+                    log.error("❌ Error saving attachment %s: %s", filename, e)
+        
+        return pending_writes
+    
+def wait_for_attachments(pending_writes):
+        """Wait for queued attachment writes and return the paths that were saved"""
+        attachment_paths = []
+        for file_path, future in pending_writes:
+            try:
+                future.result()
+                attachment_paths.append(file_path)
+                log.debug("📎 Saved attachment: %s", os.path.basename(file_path))
+            except Exception as e:
+                log.error("❌ Error saving attachment %s: %s", os.path.basename(file_path), e)
+        return attachment_paths
+    
+def fetch_raw_emails(seq_numbers):
+    """Yield (sequence number, raw bytes) for the given messages, FETCH_BATCH_SIZE per round trip"""
+    global mail_connection
+    for batch_start in range(0, len(seq_numbers), FETCH_BATCH_SIZE):
+        sequence_set = ','.join(str(seq) for seq in seq_numbers[batch_start:batch_start + FETCH_BATCH_SIZE])
+        status, data = mail_connection.fetch(sequence_set, '(RFC822)')
+        
+        if status != 'OK':
+            log.error("❌ Failed to fetch emails %s", sequence_set)
+            continue
+        
+        # Each message comes back as (b'N (RFC822 {size}', raw_bytes) followed by b')'
+        for item in data:
+            if isinstance(item, tuple):
+                yield int(item[0].split(None, 1)[0]), item[1]
+
+def fetch_email_previews(start_index, end_index):
+    """Yield (sequence number, headers + leading body bytes, attachment count, attachment names) without downloading attachments"""
+    global mail_connection
+    for batch_start in range(start_index, end_index + 1, FETCH_BATCH_SIZE):
+        batch_end = min(batch_start + FETCH_BATCH_SIZE - 1, end_index)
+        status, data = mail_connection.fetch(
+            f"{batch_start}:{batch_end}",
+            f'(BODYSTRUCTURE BODY.PEEK[HEADER] BODY.PEEK[TEXT]<0.{PREVIEW_BYTES}>)'
+        )
+        
+        if status != 'OK':
+            log.error("❌ Failed to fetch emails %s-%s", batch_start, batch_end)
+            continue
+        
+        # A message spans several entries: (meta, literal) tuples for each literal, plus bare bytes
+        # for the rest of the response; a new message starts with b'N (' in a tuple or bare entry
+        preview = None
+        for item in data:
+            meta, literal = item if isinstance(item, tuple) else (item, None)
+            match = _FETCH_START_RE.match(meta)
+            if match:
+                if preview:
+                    yield _finish_preview(preview)
+                preview = {'seq': int(match.group(1)), 'header': b'', 'text': b'', 'structure': b''}
+            if preview is None:
+                continue
+            preview['structure'] += meta
+            if literal is not None:
+                if b'BODY[HEADER]' in meta:
+                    preview['header'] = literal
+                elif b'BODY[TEXT]' in meta:
+                    preview['text'] = literal
+        if preview:
+            yield _finish_preview(preview)
+
+def _finish_preview(preview):
+    """Turn a collected FETCH response into (sequence number, partial message bytes, attachment count, attachment names)"""
+    attachment_count = len(_ATTACHMENT_DISPOSITION_RE.findall(preview['structure']))
+    attachment_names = [name.decode('utf-8', 'replace') for name in _ATTACHMENT_FILENAME_RE.findall(preview['structure'])]
+    return preview['seq'], preview['header'] + preview['text'], attachment_count, attachment_names
+
 def fetch_new_mails_to_queue(stored_count, current_count):
     """Fetch new emails from mail server and add to queue with LLM filtering"""
-    global mail_connection, email_queue, queue_lock
+    global mail_connection, email_queue
     
     try:
         # Calculate how many new emails to fetch
         num_new_emails = current_count - stored_count
-        print(f"📥 Fetching {num_new_emails} new emails...")
+        log.info("📥 Fetching %s new emails...", num_new_emails)
         
         # Fetch email IDs starting from the stored count + 1
         start_index = stored_count + 1
@@ -304,125 +541,159 @@ def fetch_new_mails_to_queue(stored_count, current_count):
         emails_added = 0
         emails_filtered = 0
         
-        # Fetch each new email
-        for i in range(start_index, end_index + 1):
+        # Fetch headers and the start of each body only; attachments are downloaded after filtering
+        parsed_emails = []
+        for i, preview_bytes, attachment_count, attachment_names in fetch_email_previews(start_index, end_index):
             try:
-                # Fetch the email by ID
-                status, data = mail_connection.fetch(str(i), '(RFC822)')
-                
-                if status != 'OK':
-                    print(f"❌ Failed to fetch email {i}")
-                    continue
-                
-                # Parse the email
-                raw_email = data[0][1]
-                msg = email.message_from_bytes(raw_email)
+                # Parse the partial email
+                msg = email.message_from_bytes(preview_bytes)
                 
                 # Extract email details
                 subject = msg.get('Subject', 'No Subject')
                 if subject:
-                    subject = str(email.header.make_header(email.header.decode_header(subject)))
+                    subject = str(make_header(decode_header(subject)))
                 
                 sender = msg.get('From', 'Unknown')
                 if sender:
                     # Extract just the email address
-                    from email.utils import parseaddr
                     _, sender_email = parseaddr(sender)
                 else:
                     sender_email = 'unknown@email.com'
                 
                 # Extract email content
-                email_content = extract_email_content(msg)
+                email_content, _ = parse_email_parts(msg)
                 
                 # Generate claim ID
                 claim_id = f"CLAIM_{uuid.uuid4().hex[:8].upper()}"
                 
-                # Process attachments
-                attachment_paths = process_email_attachments(msg, claim_id)
-                
-                # Prepare email data
-                email_data = {
+                # Prepare email data; attachment paths are filled in once the full message is fetched
+                parsed_emails.append({
                     'email_id': str(i),
                     'sender_email': sender_email,
                     'subject': subject,
                     'content': email_content,
                     'claim_id': claim_id,
-                    'attachment_count': len(attachment_paths),
-                    'attachment_paths': attachment_paths
-                }
+                    'attachment_count': attachment_count,
+                    'attachment_names': attachment_names,
+                    'attachment_paths': []
+                })
                 
-                # Apply LLM filtering
-                print(f"\n🤖 Applying LLM filter to email from: {sender_email}")
-                llm_result = fulfillment_processor.filter_email_with_llm(email_data)
+            except Exception as e:
+                log.error("❌ Error processing email %s: %s", i, e)
+                continue
+        
+        # Apply LLM filtering (classification and fulfillment verdict in one call); the Bedrock
+        # calls are independent, so run them concurrently instead of one email at a time.
+        # Sender registration checks run alongside them, once per sender
+        llm_results = []
+        registrations = {}
+        if parsed_emails:
+            log.info("\n🤖 Applying LLM filter to %s emails", len(parsed_emails))
+            senders = {email_data['sender_email'] for email_data in parsed_emails}
+            with ThreadPoolExecutor(max_workers=min(FILTER_WORKERS, len(parsed_emails) + len(senders))) as executor:
+                registration_futures = {sender: executor.submit(check_user_registration, sender) for sender in senders}
+                llm_results = list(executor.map(fulfillment_processor.triage_email_with_llm, parsed_emails))
+                registrations = {sender: future.result() for sender, future in registration_futures.items()}
+        
+        insurance_emails = {}
+        for email_data, llm_result in zip(parsed_emails, llm_results):
+            i = email_data['email_id']
+            
+            if llm_result and llm_result.get('is_insurance', False):
+                # Add LLM and registration results to email data
+                email_data['llm_filter_result'] = llm_result
+                email_data['user_registration'] = registrations[email_data['sender_email']]
+                insurance_emails[int(i)] = email_data
+            else:
+                emails_filtered += 1
+                confidence = llm_result.get('confidence', 0) if llm_result else 0
+                reason = llm_result.get('reasoning', 'Not insurance related') if llm_result else 'LLM filter failed'
+                log.info("❌ Email %s filtered out - %s (confidence: %s%%)", i, reason, confidence)
+        
+        # Download full messages only for insurance emails; attachments are written in the
+        # background while the next messages are fetched
+        downloaded = []
+        for i, raw_email in fetch_raw_emails(sorted(insurance_emails)):
+            email_data = insurance_emails[i]
+            try:
+                msg = email.message_from_bytes(raw_email)
                 
-                if llm_result and llm_result.get('is_insurance', False):
-                    # Add LLM results to email data
-                    email_data['llm_filter_result'] = llm_result
-                    
-                    # Add to queue
-                    with queue_lock:
-                        email_queue.put(email_data)
-                        emails_added += 1
-                    
-                    print(f"✅ Email {i} added to queue - {llm_result.get('category', 'unknown')} (confidence: {llm_result.get('confidence', 0)}%)")
-                else:
-                    emails_filtered += 1
-                    confidence = llm_result.get('confidence', 0) if llm_result else 0
-                    reason = llm_result.get('reasoning', 'Not insurance related') if llm_result else 'LLM filter failed'
-                    print(f"❌ Email {i} filtered out - {reason} (confidence: {confidence}%)")
-                    
-                    # Clean up attachments for filtered emails
-                    if attachment_paths:
-                        for path in attachment_paths:
-                            try:
-                                if os.path.exists(path):
-                                    os.remove(path)
-                            except:
-                                pass
-                        # Remove empty claim folder
-                        try:
-                            claim_folder = os.path.dirname(attachment_paths[0])
-                            if os.path.exists(claim_folder) and not os.listdir(claim_folder):
-                                os.rmdir(claim_folder)
-                        except:
-                            pass
+                # Re-extract the content in case the preview cut it short
+                email_data['content'], attachment_parts = parse_email_parts(msg)
+                
+                # Process attachments
+                downloaded.append((email_data, write_attachments(attachment_parts, email_data['claim_id'])))
                 
             except Exception as e:
-                print(f"❌ Error processing email {i}: {e}")
+                log.error("❌ Error processing email %s: %s", i, e)
                 continue
         
-        print(f"\n📊 Email Filtering Summary:")
-        print(f"✅ Added to queue: {emails_added} insurance-related emails")
-        print(f"❌ Filtered out: {emails_filtered} non-insurance emails")
-        print(f"📧 Total processed: {emails_added + emails_filtered} emails")
+        # Queue emails in order once each one's attachments are on disk
+        for email_data, pending_writes in downloaded:
+            i = email_data['email_id']
+            try:
+                attachment_paths = wait_for_attachments(pending_writes)
+                email_data['attachment_count'] = len(attachment_paths)
+                email_data['attachment_paths'] = attachment_paths
+                
+                # Add to queue
+                email_queue.append(email_data)
+                emails_added += 1
+                
+                llm_result = email_data['llm_filter_result']
+                log.info("✅ Email %s added to queue - %s (confidence: %s%%)", i, llm_result.get('category', 'unknown'), llm_result.get('confidence', 0))
+                
+            except Exception as e:
+                log.error("❌ Error processing email %s: %s", i, e)
+                continue
+        
+        log.info("\n📊 Email Filtering Summary:")
+        log.info("✅ Added to queue: %s insurance-related emails", emails_added)
+        log.info("❌ Filtered out: %s non-insurance emails", emails_filtered)
+        log.info("📧 Total processed: %s emails", emails_added + emails_filtered)
         
         return emails_added
         
     except Exception as e:
-        print(f"❌ Error fetching new emails: {e}")
+        log.error("❌ Error fetching new emails: %s", e)
         return 0
 
+# Token bucket limiting how fast queued emails reach Bedrock and the downstream APIs
+_bucket = {"tokens": float(PROCESS_BURST), "last": time.monotonic()}
+
+def acquire_processing_slot(cost=1):
+    """Take tokens from the bucket, sleeping only when the burst allowance is used up"""
+    now = time.monotonic()
+    _bucket["tokens"] = min(PROCESS_BURST, _bucket["tokens"] + (now - _bucket["last"]) * PROCESS_RATE)
+    _bucket["last"] = now
+    if _bucket["tokens"] < cost:
+        wait = (cost - _bucket["tokens"]) / PROCESS_RATE
+        time.sleep(wait)
+        _bucket["tokens"] = float(cost)
+        _bucket["last"] = time.monotonic()
+    _bucket["tokens"] -= cost
+
 def process_email_queue():
     """Process emails from queue with user validation and fulfillment processor"""
-    global email_queue, queue_lock
+    global email_queue
     processed_count = 0
     
-    print(f"📋 Starting queue processing - Queue Size: {email_queue.qsize()}")
+    log.info("📋 Starting queue processing - Queue Size: %s", len(email_queue))
     
-    while not email_queue.empty():
+    while email_queue:
         try:
-            with queue_lock:
-                email_data = email_queue.get_nowait()
-                remaining_queue_size = email_queue.qsize()
+            email_data = email_queue.popleft()
+            acquire_processing_slot()
+            remaining_queue_size = len(email_queue)
             
-            print("\n" + "="*60)
-            print(f"🔄 PROCESSING EMAIL #{processed_count + 1} | Remaining in Queue: {remaining_queue_size}")
-            print("="*60)
-            print(f"📧 Email ID: {email_data['email_id']}")
-            print(f"📧 Sender Email: {email_data['sender_email']}")
-            print(f"📧 Subject: {email_data['subject']}")
-            print(f"📧 Claim ID: {email_data['claim_id']}")
-            print(f"📧 Attachment Count: {email_data['attachment_count']}")
+            log.info("\n" + "="*60)
+            log.info("🔄 PROCESSING EMAIL #%s | Remaining in Queue: %s", processed_count + 1, remaining_queue_size)
+            log.info("="*60)
+            log.debug("📧 Email ID: %s", email_data['email_id'])
+            log.debug("📧 Sender Email: %s", email_data['sender_email'])
+            log.debug("📧 Subject: %s", email_data['subject'])
+            log.debug("📧 Claim ID: %s", email_data['claim_id'])
+            log.debug("📧 Attachment Count: %s", email_data['attachment_count'])
             
             # Display LLM analysis results if available
             if 'llm_filter_result' in email_data:
@@ -430,16 +701,19 @@ def process_email_queue():
                 confidence = llm_result.get('confidence', 0)
                 category = llm_result.get('category', 'unknown')
                 reasoning = llm_result.get('reasoning', 'No reasoning provided')
-                print(f"🤖 LLM Analysis - Category: {category}, Confidence: {confidence}%")
-                print(f"🤖 LLM Reasoning: {reasoning}")
+                log.info("🤖 LLM Analysis - Category: %s, Confidence: %s%%", category, confidence)
+                log.debug("🤖 LLM Reasoning: %s", reasoning)
             
-            print("="*60)
+            log.info("="*60)
             
-            # Step 1: Check user registration via FastAPI
-            is_registered, user_data = check_user_registration(email_data['sender_email'])
+            # Step 1: Check user registration via FastAPI, unless it was checked during filtering
+            registration = email_data.get('user_registration')
+            if registration is None:
+                registration = check_user_registration(email_data['sender_email'])
+            is_registered, user_data = registration
             
             if not is_registered:
-                print(f"❌ User not registered - sending rejection email via mail service")
+                log.info("❌ User not registered - sending rejection email via mail service")
                 
                 # Send unregistered user email via mail service
                 email_sent = send_unregistered_user_email_via_service(
@@ -448,46 +722,43 @@ def process_email_queue():
                 )
                 
                 if email_sent:
-                    print(f"✅ Rejection email sent to unregistered user: {email_data['sender_email']}")
+                    log.info("✅ Rejection email sent to unregistered user: %s", email_data['sender_email'])
                     processed_count += 1
                 else:
-                    print(f"❌ Failed to send rejection email to {email_data['sender_email']}")
+                    log.error("❌ Failed to send rejection email to %s", email_data['sender_email'])
                 
                 # Skip LLM processing for unregistered users
                 continue
             
             # Step 2: User is registered - proceed with LLM fulfillment processing
-            print(f"✅ User registered - proceeding with fulfillment assessment")
-            print(f"📋 User Info: {user_data.get('policy_type', 'N/A')} policy issued on {user_data.get('policy_issued_date', 'N/A')}")
+            log.info("✅ User registered - proceeding with fulfillment assessment")
+            log.info("📋 User Info: %s policy issued on %s", user_data.get('policy_type', 'N/A'), user_data.get('policy_issued_date', 'N/A'))
             
             success = fulfillment_processor.process_email_fulfillment(email_data)
             
             if success:
-                print(f"✅ Email {processed_count + 1} processed successfully through fulfillment assessment")
+                log.info("✅ Email %s processed successfully through fulfillment assessment", processed_count + 1)
             else:
-                print(f"❌ Failed to process email {processed_count + 1} in fulfillment assessment")
+                log.error("❌ Failed to process email %s in fulfillment assessment", processed_count + 1)
             
             processed_count += 1
             
-            # Add delay between processing
-            time.sleep(1)
-            
         except Exception as e:
-            print(f"❌ Error processing email from queue: {e}")
+            log.error("❌ Error processing email from queue: %s", e)
             break
     
-    final_queue_size = email_queue.qsize()
+    final_queue_size = len(email_queue)
     if processed_count > 0:
-        print(f"\n✅ Processed {processed_count} emails with user validation and fulfillment assessment | Final Queue Size: {final_queue_size}")
+        log.info("\n✅ Processed %s emails with user validation and fulfillment assessment | Final Queue Size: %s", processed_count, final_queue_size)
     else:
-        print(f"\n📧 No emails to process in queue | Queue Size: {final_queue_size}")
+        log.info("\n📧 No emails to process in queue | Queue Size: %s", final_queue_size)
     
 def monitor_mails():
     """Main monitoring loop"""
     global mail_connection, email_queue
     
-    print("🚀 Starting Mail Monitor with User Validation + Fulfillment Assessment")
-    print("="*70)
+    log.info("🚀 Starting Mail Monitor with User Validation + Fulfillment Assessment")
+    log.info("="*70)
     
     # Connect to database and mail server
     if not connect_to_database():
@@ -496,9 +767,12 @@ def monitor_mails():
     if not connect_to_mail_server():
         return False
     
+    # Prime the Bedrock client and HTTP connections to the downstream services
+    fulfillment_processor.warm_up_connections()
+    
     try:
         while True:
-            print(f"\n🔍 Checking for new mails at {datetime.now()} | Current Queue Size: {email_queue.qsize()}")
+            log.info("\n🔍 Checking for new mails at %s | Current Queue Size: %s", datetime.now(), len(email_queue))
             
             # Get current mail count from server
             current_mail_count = get_current_mail_count()
@@ -506,18 +780,18 @@ def monitor_mails():
             # Get stored mail count from database
             stored_mail_count, last_connection_time = get_stored_mail_details()
             
-            print(f"📊 Comparison - Stored: {stored_mail_count}, Current: {current_mail_count}")
+            log.info("📊 Comparison - Stored: %s, Current: %s", stored_mail_count, current_mail_count)
             
             # Check if this is the first run (database is empty)
             if last_connection_time is None:
-                print("🆕 First run detected - initializing mail count without processing existing emails")
+                log.info("🆕 First run detected - initializing mail count without processing existing emails")
                 update_mail_details(current_mail_count)
-                print(f"✅ Initialized database with current mail count: {current_mail_count}")
-                print("📧 Will start monitoring for new emails from next check onwards")
+                log.info("✅ Initialized database with current mail count: %s", current_mail_count)
+                log.info("📧 Will start monitoring for new emails from next check onwards")
                 
             # Check if there are new mails
             elif current_mail_count > stored_mail_count:
-                print(f"🆕 Found {current_mail_count - stored_mail_count} new mails!")
+                log.info("🆕 Found %s new mails!", current_mail_count - stored_mail_count)
                 
                 # Fetch new mails and add to queue with LLM filtering
                 emails_added = fetch_new_mails_to_queue(stored_mail_count, current_mail_count)
@@ -527,22 +801,25 @@ def monitor_mails():
                 
                 # Process emails from queue with user validation + fulfillment assessment
                 if emails_added > 0:
-                    print(f"🔄 Starting user validation and fulfillment assessment for {email_queue.qsize()} emails")
+                    log.info("🔄 Starting user validation and fulfillment assessment for %s emails", len(email_queue))
                     process_email_queue()
                 else:
-                    print("📧 No insurance-related emails found in new mails")
+                    log.info("📧 No insurance-related emails found in new mails")
             
             else:
-                print("📧 No new mails found")
+                log.info("📧 No new mails found")
             
-            print(f"⏰ Waiting 30 seconds before next check...")
-            time.sleep(30)
+            # Sleep until the server pushes new mail; poll if IDLE isn't available
+            log.info("⏰ Waiting for new mail (IMAP IDLE, up to %s seconds)...", IDLE_TIMEOUT)
+            if not wait_for_new_mail(IDLE_TIMEOUT):
+                log.info("⏰ Waiting %s seconds before next check...", POLL_INTERVAL)
+                time.sleep(POLL_INTERVAL)
             
     except KeyboardInterrupt:
-        print("\n🛑 Mail monitoring stopped by user")
+        log.info("\n🛑 Mail monitoring stopped by user")
         return True
     except Exception as e:
-        print(f"❌ Monitoring error: {e}")
+        log.error("❌ Monitoring error: %s", e)
         return False
     finally:
         # Close connections
@@ -553,10 +830,17 @@ def monitor_mails():
             except:
                 pass
         
+        # Let queued attachment writes, fulfillment saves and customer mails finish before disconnecting
+        _attachment_executor.shutdown(wait=True)
+        fulfillment_processor.shutdown_background_tasks()
+        
         # Disconnect from MongoDB
         mongodb_manager.disconnect()
         
-        print("🔒 All connections closed")
+        log.info("🔒 All connections closed")
 
 if __name__ == "__main__":
+    # kill -HUP reloads edited prompt files without a restart (not available on Windows)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: invalidate_prompt_cache())
     monitor_mails() 
\ No newline at end of file
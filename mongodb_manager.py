@@ -1,51 +1,97 @@
 import os
-import json
+import orjson
 import uuid
+import hashlib
+import shutil
 import gridfs
 from datetime import datetime
-from typing import Optional, Dict, Any, List
-from pymongo import MongoClient
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Dict, Any, List, Union
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from pymongo.write_concern import WriteConcern
+from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from dotenv import load_dotenv
+import redis_cache
+from log_queue import get_logger
 
 load_dotenv()
 
+log = get_logger("mongodb_manager")
+
 # Global variables for MongoDB connection
 connection_string = os.getenv('MONGODB_CONNECTION_STRING', 'mongodb://localhost:27017/')
 database_name = os.getenv('MONGODB_DATABASE', 'insurance_claims')
 client = None
 db = None
 fs = None
+# Collection handles bound once in connect() so helpers skip the db.<name> lookup
+users_col = None
+fulfillment_col = None
+attachments_col = None
+mail_tracking_col = None
+mail_tracking_latest_col = None
+fs_files_col = None
+MAX_UPLOAD_WORKERS = 8
+# 1MB GridFS chunks: a quarter of the chunk documents of the 255KB default
+GRIDFS_CHUNK_SIZE = 1024 * 1024
+# Motor client used by the async API endpoints (sync client above stays for scripts)
+async_client = None
+async_db = None
+
+def _connection_options() -> Dict[str, Any]:
+    """Client options shared by the sync and async MongoDB clients"""
+    # Add connection options for better reliability
+    connection_options = {
+        'serverSelectionTimeoutMS': 5000,
+        'connectTimeoutMS': 10000,
+        'socketTimeoutMS': 20000,
+        # Pool sizing: keep warm connections around and fail fast when the pool is exhausted
+        # Each service process (and each uvicorn worker) gets its own pool, so keep them modest
+        'maxPoolSize': int(os.getenv('MONGO_MAX_POOL', '32')),
+        'minPoolSize': int(os.getenv('MONGO_MIN_POOL', '4')),
+        'maxIdleTimeMS': 60000,
+        'waitQueueTimeoutMS': 2000,
+        # Topology checks every 30s instead of 10s; failover is still detected on the next failed op
+        'heartbeatFrequencyMS': 30000,
+        'retryWrites': True,
+        'w': 'majority',
+        # Wire compression for large mail bodies; the server picks the first codec it supports
+        'compressors': 'zstd,snappy,zlib',
+        'zlibCompressionLevel': 6,
+    }
+    
+    # For Atlas connections, add TLS options for Windows compatibility
+    if 'mongodb+srv://' in connection_string:
+        connection_options.update({
+            'tls': True,
+            'tlsAllowInvalidCertificates': True,
+            'tlsAllowInvalidHostnames': True,
+        })
+    return connection_options
 
 def connect():
     """Connect to MongoDB and initialize GridFS"""
-    global client, db, fs
+    global client, db, fs, users_col, fulfillment_col, attachments_col, mail_tracking_col, mail_tracking_latest_col, fs_files_col
     try:
-        # Add connection options for better reliability
-        connection_options = {
-            'serverSelectionTimeoutMS': 5000,
-            'connectTimeoutMS': 10000,
-            'socketTimeoutMS': 20000,
-        }
-        
-        # For Atlas connections, add TLS options for Windows compatibility
-        if 'mongodb+srv://' in connection_string:
-            connection_options.update({
-                'tls': True,
-                'tlsAllowInvalidCertificates': True,
-                'tlsAllowInvalidHostnames': True,
-            })
-        
-        client = MongoClient(connection_string, **connection_options)
+        # Defer the handshake to the ping below instead of starting it in the constructor
+        client = MongoClient(connection_string, connect=False, **_connection_options())
         db = client[database_name]
         fs = gridfs.GridFS(db)
+        users_col = db.users
+        fulfillment_col = db.fulfillment
+        attachments_col = db.get_collection("attachments", write_concern=ATTACHMENTS_WRITE_CONCERN)
+        mail_tracking_col = db.get_collection("mail_tracking", write_concern=MAIL_HISTORY_WRITE_CONCERN)
+        mail_tracking_latest_col = db.mail_tracking_latest
+        fs_files_col = db.fs.files
         
-        # Test connection
-        client.server_info()
-        print("✅ MongoDB connection established")
+        # Test connection; ping replies with just {ok: 1}, unlike the full buildInfo document
+        client.admin.command('ping')
+        log.info("✅ MongoDB connection established")
         return True
     except Exception as e:
-        print(f"❌ MongoDB connection failed: {e}")
+        log.error("❌ MongoDB connection failed: %s", e)
         return False
 
 def disconnect():
@@ -53,50 +99,113 @@ def disconnect():
     global client
     if client:
         client.close()
-        print("✅ MongoDB connection closed")
+        log.info("✅ MongoDB connection closed")
+
+async def connect_async():
+    """Connect the Motor client; must be called from the running event loop"""
+    global async_client, async_db
+    try:
+        async_client = AsyncIOMotorClient(connection_string, **_connection_options())
+        async_db = async_client[database_name]
+        await async_client.admin.command('ping')
+        log.info("✅ MongoDB async connection established")
+        return True
+    except Exception as e:
+        log.error("❌ MongoDB async connection failed: %s", e)
+        return False
+
+def disconnect_async():
+    """Close Motor client"""
+    global async_client
+    if async_client:
+        async_client.close()
+        async_client = None
+        log.info("✅ MongoDB async connection closed")
+
+# Fields read by the user validator and mail monitor; other user fields stay on the server
+USER_PROJECTION = {"mail_id": 1, "policy_type": 1, "policy_issued_date": 1, "policy_issued_date_str": 1}
 
 # User Management Functions
-def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
+def get_user_by_email(email: str, projection: Optional[Dict[str, Any]] = USER_PROJECTION) -> Optional[Dict[str, Any]]:
     """Get user details by email"""
     try:
-        user = db.users.find_one({"mail_id": email})
+        user = users_col.find_one({"mail_id": email}, projection)
         if user and "_id" in user:
             user["_id"] = str(user["_id"])
         return user
     except Exception as e:
-        print(f"❌ Error getting user: {e}")
+        log.error("❌ Error getting user: %s", e)
         return None
 
 def create_user(user_data: Dict[str, Any]) -> bool:
-    """Create a new user"""
+    """Create a new user and register the email in the user_validator Bloom filter"""
     try:
-        db.users.insert_one(user_data)
+        # Pre-format the policy date so reads don't have to
+        if hasattr(user_data.get("policy_issued_date"), 'strftime'):
+            user_data["policy_issued_date_str"] = user_data["policy_issued_date"].strftime('%Y-%m-%d')
+        users_col.insert_one(user_data)
+        if redis_cache.client is None:
+            redis_cache.connect()
+        if not redis_cache.bloom_add(redis_cache.USERS_BLOOM_KEY, user_data["mail_id"]):
+            # The validator trusts the filter's negatives; stop that until it is reseeded
+            redis_cache.bloom_mark_ready(redis_cache.USERS_BLOOM_KEY, False)
         return True
     except Exception as e:
-        print(f"❌ Error creating user: {e}")
+        log.error("❌ Error creating user: %s", e)
         return False
 
+def get_all_user_emails() -> List[str]:
+    """Get every registered user email"""
+    try:
+        return [user["mail_id"] for user in users_col.find({}, {"mail_id": 1, "_id": 0}) if "mail_id" in user]
+    except Exception as e:
+        log.error("❌ Error listing user emails: %s", e)
+        return []
+
+# Attachment metadata is non-critical, so skip the journal fsync on each write
+ATTACHMENTS_WRITE_CONCERN = WriteConcern(w=1, j=False)
+# Mail tracking history is telemetry; send it without waiting for an acknowledgement
+MAIL_HISTORY_WRITE_CONCERN = WriteConcern(w=0)
+
+def _attachment_ops(request_data: Dict[str, Any]) -> List[UpdateOne]:
+    """Build one upsert per attachment file ID of a fulfillment request"""
+    return [
+        UpdateOne(
+            {"file_id": file_id},
+            {"$set": {
+                "file_id": file_id,
+                "claim_id": request_data.get("claim_id"),
+                "user_mail": request_data.get("user_mail"),
+                "updated_at": request_data["updated_at"]
+            }},
+            upsert=True
+        )
+        for file_id in request_data.get("attachment_file_ids") or []
+    ]
+
 # Fulfillment Request Functions
-def create_fulfillment_request(request_data: Dict[str, Any]) -> Optional[str]:
+def create_fulfillment_request(request_data: Dict[str, Any], now: Optional[datetime] = None) -> Optional[str]:
     """Create a new fulfillment request"""
     try:
-        request_data["created_at"] = datetime.now()
-        request_data["updated_at"] = datetime.now()
-        result = db.fulfillment.insert_one(request_data)
+        request_data["created_at"] = request_data["updated_at"] = now or datetime.now()
+        result = fulfillment_col.insert_one(request_data)
+        ops = _attachment_ops(request_data)
+        if ops:
+            attachments_col.bulk_write(ops, ordered=False)
         return str(result.inserted_id)
     except Exception as e:
-        print(f"❌ Error creating fulfillment request: {e}")
+        log.error("❌ Error creating fulfillment request: %s", e)
         return None
 
-def get_fulfillment_request(claim_id: str) -> Optional[Dict[str, Any]]:
-    """Get fulfillment request by claim ID"""
+def get_fulfillment_request(claim_id: str, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Get fulfillment request by claim ID, optionally limited to the projected fields"""
     try:
-        request = db.fulfillment.find_one({"claim_id": claim_id})
+        request = fulfillment_col.find_one({"claim_id": claim_id}, projection)
         if request and "_id" in request:
             request["_id"] = str(request["_id"])
         return request
     except Exception as e:
-        print(f"❌ Error getting fulfillment request: {e}")
+        log.error("❌ Error getting fulfillment request: %s", e)
         return None
 
 def update_fulfillment_status(claim_id: str, status: str, s3_url: Optional[str] = None) -> bool:
@@ -109,88 +218,222 @@ def update_fulfillment_status(claim_id: str, status: str, s3_url: Optional[str]
         if s3_url:
             update_data["s3_url"] = s3_url
             
-        result = db.fulfillment.update_one(
+        result = fulfillment_col.update_one(
             {"claim_id": claim_id},
             {"$set": update_data}
         )
         return result.modified_count > 0
     except Exception as e:
-        print(f"❌ Error updating fulfillment status: {e}")
+        log.error("❌ Error updating fulfillment status: %s", e)
         return False
 
 def update_fulfillment_request(claim_id: str, update_data: Dict[str, Any]) -> bool:
     """Update fulfillment request with any data"""
     try:
         update_data["updated_at"] = datetime.now()
-        result = db.fulfillment.update_one(
+        result = fulfillment_col.update_one(
             {"claim_id": claim_id},
             {"$set": update_data}
         )
         return result.modified_count > 0
     except Exception as e:
-        print(f"❌ Error updating fulfillment request: {e}")
+        log.error("❌ Error updating fulfillment request: %s", e)
+        return False
+
+async def create_fulfillment_request_async(request_data: Dict[str, Any], now: Optional[datetime] = None) -> Optional[str]:
+    """Create a new fulfillment request without blocking the event loop"""
+    try:
+        request_data["created_at"] = request_data["updated_at"] = now or datetime.now()
+        result = await async_db.fulfillment.insert_one(request_data)
+        ops = _attachment_ops(request_data)
+        if ops:
+            await async_db.get_collection("attachments", write_concern=ATTACHMENTS_WRITE_CONCERN).bulk_write(ops, ordered=False)
+        return str(result.inserted_id)
+    except Exception as e:
+        log.error("❌ Error creating fulfillment request: %s", e)
+        return None
+
+async def create_fulfillment_requests_async(requests_data: List[Dict[str, Any]]) -> List[str]:
+    """Create several fulfillment requests with one insert_many; returns the IDs that were stored"""
+    try:
+        now = datetime.now()
+        for request_data in requests_data:
+            request_data["created_at"] = now
+            request_data["updated_at"] = now
+        try:
+            await async_db.fulfillment.insert_many(requests_data, ordered=False)
+            inserted = requests_data
+        except BulkWriteError as e:
+            # Unordered inserts keep going past errors (e.g. a duplicate claim_id); keep the ones that landed
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            inserted = [request_data for i, request_data in enumerate(requests_data) if i not in failed]
+            log.error("❌ Stored %s of %s fulfillment requests: %s", e.details.get("nInserted", len(inserted)), len(requests_data), e)
+        ops = [op for request_data in inserted for op in _attachment_ops(request_data)]
+        if ops:
+            await async_db.get_collection("attachments", write_concern=ATTACHMENTS_WRITE_CONCERN).bulk_write(ops, ordered=False)
+        return [str(request_data["_id"]) for request_data in inserted]
+    except Exception as e:
+        log.error("❌ Error creating fulfillment requests: %s", e)
+        return []
+
+async def get_fulfillment_request_async(claim_id: str, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Get fulfillment request by claim ID without blocking the event loop"""
+    try:
+        request = await async_db.fulfillment.find_one({"claim_id": claim_id}, projection)
+        if request and "_id" in request:
+            request["_id"] = str(request["_id"])
+        return request
+    except Exception as e:
+        log.error("❌ Error getting fulfillment request: %s", e)
+        return None
+
+async def update_fulfillment_request_async(claim_id: str, update_data: Dict[str, Any]) -> bool:
+    """Update fulfillment request without blocking the event loop"""
+    try:
+        update_data["updated_at"] = datetime.now()
+        result = await async_db.fulfillment.update_one(
+            {"claim_id": claim_id},
+            {"$set": update_data}
+        )
+        return result.modified_count > 0
+    except Exception as e:
+        log.error("❌ Error updating fulfillment request: %s", e)
+        return False
+
+# Background Task Functions
+def record_failed_task(task_name: str, claim_id: str, error: str) -> bool:
+    """Record a background task that exhausted its retries so it can be reconciled later"""
+    try:
+        db.failed_tasks.insert_one({
+            "task_name": task_name,
+            "claim_id": claim_id,
+            "error": error,
+            "created_at": datetime.now()
+        })
+        return True
+    except Exception as e:
+        log.error("❌ Error recording failed task: %s", e)
+        return False
+
+async def record_failed_task_async(task_name: str, claim_id: str, error: str, payload: Optional[Dict[str, Any]] = None) -> bool:
+    """Async variant of record_failed_task; payload keeps the unsaved document so it can be replayed"""
+    try:
+        await async_db.failed_tasks.insert_one({
+            "task_name": task_name,
+            "claim_id": claim_id,
+            "error": error,
+            "payload": payload,
+            "created_at": datetime.now()
+        })
+        return True
+    except Exception as e:
+        log.error("❌ Error recording failed task: %s", e)
         return False
 
 # Mail Tracking Functions
+# The current state lives in one mail_tracking_latest document; mail_tracking keeps the history
+MAIL_TRACKING_LATEST_ID = "latest"
+
 def get_last_mail_details() -> Optional[Dict[str, Any]]:
     """Get last mail tracking details"""
     try:
-        # Get the most recent record
-        details = db.mail_tracking.find_one(
-            {},
-            sort=[("_id", -1)]
-        )
+        details = mail_tracking_latest_col.find_one({"_id": MAIL_TRACKING_LATEST_ID})
+        if details is None:
+            # Deployments from before the singleton only have the history; take its newest record
+            details = mail_tracking_col.find_one(
+                {},
+                {"mail_count": 1, "last_connection_time": 1},
+                sort=[("_id", -1)],
+                hint=[("_id", 1)]
+            )
         if details and "_id" in details:
             details["_id"] = str(details["_id"])
         return details
     except Exception as e:
-        print(f"❌ Error getting last mail details: {e}")
+        log.error("❌ Error getting last mail details: %s", e)
         return None
 
 def update_mail_tracking(mail_count: int, last_connection_time: datetime) -> bool:
     """Update mail tracking information"""
     try:
-        db.mail_tracking.insert_one({
+        now = datetime.now()
+        mail_tracking_latest_col.update_one(
+            {"_id": MAIL_TRACKING_LATEST_ID},
+            {"$set": {
+                "mail_count": mail_count,
+                "last_connection_time": last_connection_time,
+                "updated_at": now
+            }},
+            upsert=True
+        )
+        mail_tracking_col.insert_one({
             "mail_count": mail_count,
             "last_connection_time": last_connection_time,
-            "created_at": datetime.now()
+            "created_at": now
         })
         return True
     except Exception as e:
-        print(f"❌ Error updating mail tracking: {e}")
+        log.error("❌ Error updating mail tracking: %s", e)
+        return False
+
+# Maintenance Cleanup Functions
+def get_cleanup_cursor(folder: str) -> Optional[Dict[str, Any]]:
+    """Get the attachments folder state recorded by the last maintenance cleanup"""
+    try:
+        return db.cleanup_cursor.find_one({"_id": folder})
+    except Exception as e:
+        log.error("❌ Error getting cleanup cursor: %s", e)
+        return None
+
+def set_cleanup_cursor(folder: str, folder_mtime_ns: int, oldest_claim_mtime: Optional[float]) -> bool:
+    """Record the attachments folder mtime and the oldest claim folder left after a cleanup"""
+    try:
+        db.cleanup_cursor.update_one(
+            {"_id": folder},
+            {"$set": {
+                "folder_mtime_ns": folder_mtime_ns,
+                "oldest_claim_mtime": oldest_claim_mtime,
+                "updated_at": datetime.now()
+            }},
+            upsert=True
+        )
+        return True
+    except Exception as e:
+        log.error("❌ Error updating cleanup cursor: %s", e)
         return False
 
 # GridFS File Storage Functions
-def upload_file(file_data: bytes, filename: str, metadata: Dict[str, Any]) -> Optional[str]:
-    """Upload file to GridFS and return file ID"""
+def _as_object_id(file_id) -> ObjectId:
+    """Accept an ObjectId or its hex string; ObjectIds pass through without re-parsing"""
+    return file_id if isinstance(file_id, ObjectId) else ObjectId(file_id)
+
+def upload_file(file_data: bytes, filename: str, metadata: Dict[str, Any], upload_date: Optional[datetime] = None) -> Optional[ObjectId]:
+    """Upload file to GridFS and return its ObjectId"""
     try:
         file_id = fs.put(
             file_data,
             filename=filename,
             metadata=metadata,
-            upload_date=datetime.now()
+            upload_date=upload_date or datetime.now(),
+            chunkSize=GRIDFS_CHUNK_SIZE
         )
-        return str(file_id)
+        return file_id
     except Exception as e:
-        print(f"❌ Error uploading file to GridFS: {e}")
+        log.error("❌ Error uploading file to GridFS: %s", e)
         return None
 
-def download_file(file_id: str) -> Optional[bytes]:
+def download_file(file_id: Union[ObjectId, str]) -> Optional[bytes]:
     """Download file from GridFS by file ID"""
     try:
-        if isinstance(file_id, str):
-            file_id = ObjectId(file_id)
-        return fs.get(file_id).read()
+        return fs.get(_as_object_id(file_id)).read()
     except Exception as e:
-        print(f"❌ Error downloading file from GridFS: {e}")
+        log.error("❌ Error downloading file from GridFS: %s", e)
         return None
 
-def get_file_metadata(file_id: str) -> Optional[Dict[str, Any]]:
+def get_file_metadata(file_id: Union[ObjectId, str]) -> Optional[Dict[str, Any]]:
     """Get file metadata from GridFS"""
     try:
-        if isinstance(file_id, str):
-            file_id = ObjectId(file_id)
-        file_doc = fs.get(file_id)
+        file_doc = fs.get(_as_object_id(file_id))
         return {
             "filename": file_doc.filename,
             "upload_date": file_doc.upload_date,
@@ -198,47 +441,52 @@ def get_file_metadata(file_id: str) -> Optional[Dict[str, Any]]:
             "length": file_doc.length
         }
     except Exception as e:
-        print(f"❌ Error getting file metadata: {e}")
+        log.error("❌ Error getting file metadata: %s", e)
         return None
 
-def delete_file(file_id: str) -> bool:
+def delete_file(file_id: Union[ObjectId, str]) -> bool:
     """Delete file from GridFS"""
     try:
-        if isinstance(file_id, str):
-            file_id = ObjectId(file_id)
-        fs.delete(file_id)
+        fs.delete(_as_object_id(file_id))
         return True
     except Exception as e:
-        print(f"❌ Error deleting file from GridFS: {e}")
+        log.error("❌ Error deleting file from GridFS: %s", e)
         return False
 
-def upload_mail_content(user_email: str, claim_id: str, mail_content: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def upload_mail_content(user_email: str, claim_id: str, mail_content: Dict[str, Any], now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
     """Upload mail content to GridFS"""
     try:
-        # Convert datetime objects to strings for JSON serialization
-        serializable_content = {}
-        for key, value in mail_content.items():
-            if hasattr(value, 'isoformat'):  # datetime object
-                serializable_content[key] = value.isoformat()
-            else:
-                serializable_content[key] = value
+        now = now or datetime.now()
         
-        # Convert mail content to JSON bytes
-        mail_bytes = json.dumps(serializable_content, indent=2).encode('utf-8')
+        # Convert mail content to JSON bytes; orjson writes datetimes as ISO 8601 itself
+        mail_bytes = orjson.dumps(mail_content, option=orjson.OPT_INDENT_2)
         filename = f"{claim_id}_mail_content.json"
         
+        # Re-uploading identical content for the same claim (e.g. a retry) reuses the stored file
+        digest = hashlib.sha256(mail_bytes).hexdigest()
+        existing = fs_files_col.find_one({"metadata.sha256": digest, "metadata.claim_id": claim_id}, {"_id": 1, "metadata": 1})
+        if existing:
+            return {
+                "file_id": str(existing["_id"]),
+                "filename": filename,
+                "size": len(mail_bytes),
+                "metadata": existing.get("metadata"),
+                "deduplicated": True
+            }
+        
         metadata = {
             "claim_id": claim_id,
             "user_email": user_email,
             "type": "mail_content",
-            "timestamp": datetime.now().isoformat()
+            "sha256": digest,
+            "timestamp": now.isoformat()
         }
         
-        file_id = upload_file(mail_bytes, filename, metadata)
+        file_id = upload_file(mail_bytes, filename, metadata, upload_date=now)
         
         if file_id:
             return {
-                "file_id": file_id,
+                "file_id": str(file_id),
                 "filename": filename,
                 "size": len(mail_bytes),
                 "metadata": metadata
@@ -246,83 +494,116 @@ def upload_mail_content(user_email: str, claim_id: str, mail_content: Dict[str,
         return None
         
     except Exception as e:
-        print(f"❌ Error uploading mail content: {e}")
+        log.error("❌ Error uploading mail content: %s", e)
         return None
 
-def upload_attachment(user_email: str, claim_id: str, attachment_path: str) -> Optional[Dict[str, Any]]:
+def hash_file(f, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of an open binary file from its current position, read in 1MB chunks"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def upload_attachment(user_email: str, claim_id: str, attachment_path: str, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
     """Upload attachment file to GridFS"""
     try:
-        if not os.path.exists(attachment_path):
-            print(f"❌ Attachment file not found: {attachment_path}")
-            return None
-        
+        now = now or datetime.now()
         filename = os.path.basename(attachment_path)
-        file_size = os.path.getsize(attachment_path)
-        
-        with open(attachment_path, 'rb') as f:
-            file_data = f.read()
-        
-        metadata = {
-            "claim_id": claim_id,
-            "user_email": user_email,
-            "type": "attachment",
-            "original_filename": filename,
-            "file_size": file_size,
-            "timestamp": datetime.now().isoformat()
-        }
         
-        file_id = upload_file(file_data, filename, metadata)
+        try:
+            src = open(attachment_path, 'rb')
+        except FileNotFoundError:
+            log.error("❌ Attachment file not found: %s", attachment_path)
+            return None
         
-        if file_id:
-            return {
-                "file_id": file_id,
-                "filename": filename,
-                "size": file_size,
-                "metadata": metadata
+        with src:
+            file_size = os.fstat(src.fileno()).st_size
+            
+            # Identical files within a claim (e.g. the same bill resent) are stored once; the lookup
+            # is scoped to the claim so another claim's file and metadata are never reused
+            digest = hash_file(src)
+            existing = fs_files_col.find_one({"metadata.sha256": digest, "metadata.claim_id": claim_id}, {"_id": 1, "metadata": 1})
+            if existing:
+                return {
+                    "file_id": str(existing["_id"]),
+                    "filename": filename,
+                    "size": file_size,
+                    "metadata": existing.get("metadata"),
+                    "deduplicated": True
+                }
+            
+            metadata = {
+                "claim_id": claim_id,
+                "user_email": user_email,
+                "type": "attachment",
+                "original_filename": filename,
+                "file_size": file_size,
+                "sha256": digest,
+                "timestamp": now.isoformat()
             }
-        return None
+            
+            # Stream into GridFS a chunk at a time instead of reading the whole file into memory
+            src.seek(0)
+            with fs.new_file(filename=filename, metadata=metadata, upload_date=now, chunkSize=GRIDFS_CHUNK_SIZE) as dst:
+                shutil.copyfileobj(src, dst, GRIDFS_CHUNK_SIZE)
+        
+        return {
+            "file_id": str(dst._id),
+            "filename": filename,
+            "size": file_size,
+            "metadata": metadata
+        }
         
     except Exception as e:
-        print(f"❌ Error uploading attachment: {e}")
+        log.error("❌ Error uploading attachment: %s", e)
         return None
 
 def upload_complete_email(email_data: Dict[str, Any], claim_id: str) -> Optional[Dict[str, Any]]:
     """Upload complete email with attachments to GridFS"""
     try:
         user_email = email_data.get('sender_email') or email_data.get('from')
-        print(f"📝 Starting GridFS upload for claim {claim_id}, user: {user_email}")
-        print(f"   Email data keys: {list(email_data.keys())}")
+        log.info("📝 Starting GridFS upload for claim %s, user: %s", claim_id, user_email)
+        log.debug("   Email data keys: %s", list(email_data.keys()))
         
+        # One timestamp covers the mail content and every attachment of this claim
+        now = datetime.now()
         upload_result = {
             "claim_id": claim_id,
             "user_email": user_email,
-            "upload_timestamp": datetime.now().isoformat(),
+            "upload_timestamp": now.isoformat(),
             "mail_content": None,
             "attachments": []
         }
         
-        # Upload mail content
-        mail_content_result = upload_mail_content(user_email, claim_id, email_data)
-        if mail_content_result:
-            upload_result["mail_content"] = mail_content_result
-            print(f"✅ Mail content uploaded: {mail_content_result['filename']}")
+        # Upload mail content and attachments together; GridFS writes are network-bound
+        # upload_attachment reports and skips files that have gone missing
+        attachment_paths = email_data.get('attachment_paths') or []
+        with ThreadPoolExecutor(max_workers=min(MAX_UPLOAD_WORKERS, len(attachment_paths) + 1)) as executor:
+            mail_future = executor.submit(upload_mail_content, user_email, claim_id, email_data, now)
+            att_futures = [executor.submit(upload_attachment, user_email, claim_id, path, now) for path in attachment_paths]
+            
+            # Report each upload as it lands
+            for future in as_completed([mail_future] + att_futures):
+                result = future.result()
+                if not result:
+                    continue
+                kind = "Mail content" if future is mail_future else "Attachment"
+                if result.get("deduplicated"):
+                    log.info("♻️ %s already stored, reusing file: %s", kind, result['filename'])
+                else:
+                    log.info("✅ %s uploaded: %s", kind, result['filename'])
         
-        # Upload attachments
-        if 'attachment_paths' in email_data and email_data['attachment_paths']:
-            for attachment_path in email_data['attachment_paths']:
-                if os.path.exists(attachment_path):
-                    att_result = upload_attachment(user_email, claim_id, attachment_path)
-                    if att_result:
-                        upload_result["attachments"].append(att_result)
-                        print(f"✅ Attachment uploaded: {att_result['filename']}")
+        upload_result["mail_content"] = mail_future.result()
+        # Keep attachments in their original order
+        upload_result["attachments"] = [future.result() for future in att_futures if future.result()]
         
-        # Store upload summary in database (optional - can be removed if not needed)
-        # db.upload_summaries.insert_one(upload_result)
+        # No separate summary write: the caller stores these file IDs on the fulfillment
+        # document in the same insert that creates it
         
         return upload_result
         
     except Exception as e:
-        print(f"❌ Error uploading complete email: {e}")
+        log.error("❌ Error uploading complete email: %s", e)
         return None
 
 # Initialize collections with indexes
@@ -332,17 +613,48 @@ def initialize_collections():
         # Users collection indexes
         db.users.create_index("mail_id", unique=True)
         
+        # Backfill pre-formatted policy dates for users created before policy_issued_date_str existed
+        db.users.update_many(
+            {"policy_issued_date": {"$type": "date"}, "policy_issued_date_str": {"$exists": False}},
+            [{"$set": {"policy_issued_date_str": {
+                "$dateToString": {"format": "%Y-%m-%d", "date": "$policy_issued_date"}
+            }}}]
+        )
+        
         # Fulfillment collection indexes
         db.fulfillment.create_index("claim_id", unique=True)
-        db.fulfillment.create_index("user_mail")
-        db.fulfillment.create_index("fulfillment_status")
+        # A user's claims by status, newest first; also serves user_mail-only lookups
+        db.fulfillment.create_index(
+            [("user_mail", 1), ("fulfillment_status", 1), ("updated_at", -1)],
+            name="user_status_time"
+        )
+        # Superseded by user_status_time and pending_worklist
+        for index_name in ("user_mail_1", "fulfillment_status_1"):
+            try:
+                db.fulfillment.drop_index(index_name)
+            except OperationFailure:
+                pass
+        # Worklist of pending requests, oldest first; only pending docs are indexed
+        db.fulfillment.create_index(
+            [("fulfillment_status", 1), ("created_at", 1)],
+            name="pending_worklist",
+            partialFilterExpression={"fulfillment_status": "pending"}
+        )
+        
+        # Attachments collection indexes
+        db.attachments.create_index("file_id", unique=True)
+        db.attachments.create_index("claim_id")
+        
+        # GridFS attachment and mail-content dedup lookups, and a claim's stored files by type
+        db.fs.files.create_index("metadata.sha256", sparse=True)
+        db.fs.files.create_index([("metadata.claim_id", 1), ("metadata.type", 1)])
         
         # Mail tracking indexes
         db.mail_tracking.create_index("created_at")
         
-        print("✅ MongoDB collections and indexes initialized")
+        log.info("✅ MongoDB collections and indexes initialized")
         return True
         
     except Exception as e:
-        print(f"❌ Error initializing collections: {e}")
+        log.error("❌ Error initializing collections: %s", e)
         return False 
\ No newline at end of file
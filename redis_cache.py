@@ -0,0 +1,196 @@
+import os
+import json
+import redis
+import redis.asyncio
+from typing import Optional, Any
+
+# Global variables for Redis connection
+client = None
+# asyncio client used by async endpoints
+async_client = None
+
+def _redis_url():
+    """Read REDIS_URL at connect time so it is picked up after .env has been loaded"""
+    return os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+def connect():
+    """Connect to Redis; caching stays disabled if the server is unreachable"""
+    global client
+    try:
+        client = redis.Redis.from_url(
+            _redis_url(),
+            decode_responses=True,
+            socket_connect_timeout=2,
+            socket_timeout=2,
+        )
+        client.ping()
+        print("✅ Redis connection established")
+        return True
+    except Exception as e:
+        client = None
+        print(f"⚠️ Redis unavailable, caching disabled: {e}")
+        return False
+
+def disconnect():
+    """Close Redis connection"""
+    global client
+    if client:
+        client.close()
+        client = None
+        print("✅ Redis connection closed")
+
+async def connect_async():
+    """Connect the asyncio Redis client; caching stays disabled if the server is unreachable"""
+    global async_client
+    try:
+        async_client = redis.asyncio.Redis.from_url(
+            _redis_url(),
+            decode_responses=True,
+            socket_connect_timeout=2,
+            socket_timeout=2,
+        )
+        await async_client.ping()
+        print("✅ Redis async connection established")
+        return True
+    except Exception as e:
+        async_client = None
+        print(f"⚠️ Redis unavailable, async caching disabled: {e}")
+        return False
+
+async def disconnect_async():
+    """Close asyncio Redis connection"""
+    global async_client
+    if async_client:
+        await async_client.aclose()
+        async_client = None
+        print("✅ Redis async connection closed")
+
+def _json_default(value):
+    """Encode datetimes the same way FastAPI does so cached and fresh responses match"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+def get_json(key: str) -> Optional[Any]:
+    """Get a JSON value from the cache, or None on a miss"""
+    if client is None:
+        return None
+    try:
+        raw = client.get(key)
+        return json.loads(raw) if raw is not None else None
+    except Exception as e:
+        print(f"❌ Error reading cache key {key}: {e}")
+        return None
+
+def set_json(key: str, value: Any, ttl_seconds: int) -> bool:
+    """Store a JSON value in the cache with a TTL"""
+    if client is None:
+        return False
+    try:
+        client.setex(key, ttl_seconds, json.dumps(value, default=_json_default))
+        return True
+    except Exception as e:
+        print(f"❌ Error writing cache key {key}: {e}")
+        return False
+
+def delete(*keys: str) -> bool:
+    """Remove keys from the cache"""
+    if client is None:
+        return False
+    try:
+        client.delete(*keys)
+        return True
+    except Exception as e:
+        print(f"❌ Error deleting cache keys {keys}: {e}")
+        return False
+
+async def get_json_async(key: str) -> Optional[Any]:
+    """Async variant of get_json"""
+    if async_client is None:
+        return None
+    try:
+        raw = await async_client.get(key)
+        return json.loads(raw) if raw is not None else None
+    except Exception as e:
+        print(f"❌ Error reading cache key {key}: {e}")
+        return None
+
+async def set_json_async(key: str, value: Any, ttl_seconds: int) -> bool:
+    """Async variant of set_json"""
+    if async_client is None:
+        return False
+    try:
+        await async_client.setex(key, ttl_seconds, json.dumps(value, default=_json_default))
+        return True
+    except Exception as e:
+        print(f"❌ Error writing cache key {key}: {e}")
+        return False
+
+async def delete_async(*keys: str) -> bool:
+    """Async variant of delete"""
+    if async_client is None:
+        return False
+    try:
+        await async_client.delete(*keys)
+        return True
+    except Exception as e:
+        print(f"❌ Error deleting cache keys {keys}: {e}")
+        return False
+
+# Bloom filter helpers (require the RedisBloom module)
+USERS_BLOOM_KEY = "users:bloom"
+
+def bloom_reserve(key: str, error_rate: float, capacity: int) -> bool:
+    """Create a Bloom filter; False if another process already created it or RedisBloom is missing"""
+    if client is None:
+        return False
+    try:
+        client.execute_command("BF.RESERVE", key, error_rate, capacity)
+        return True
+    except redis.ResponseError as e:
+        if "exists" in str(e).lower():
+            return False
+        print(f"⚠️ Bloom filter {key} unavailable: {e}")
+        return False
+    except Exception as e:
+        print(f"❌ Error reserving bloom filter {key}: {e}")
+        return False
+
+def bloom_add(key: str, *items: str) -> bool:
+    """Add items to a Bloom filter in batches"""
+    if client is None or not items:
+        return False
+    try:
+        for start in range(0, len(items), 1000):
+            client.execute_command("BF.MADD", key, *items[start:start + 1000])
+        return True
+    except Exception as e:
+        print(f"❌ Error adding to bloom filter {key}: {e}")
+        return False
+
+def bloom_mark_ready(key: str, ready: bool = True) -> bool:
+    """Flag a Bloom filter as fully seeded (or not), so its negatives can be trusted"""
+    if client is None:
+        return False
+    try:
+        if ready:
+            client.set(f"{key}:ready", 1)
+        else:
+            client.delete(f"{key}:ready")
+        return True
+    except Exception as e:
+        print(f"❌ Error updating bloom filter {key} state: {e}")
+        return False
+
+def bloom_might_contain(key: str, item: str) -> bool:
+    """Return False only when the filter is seeded and rules the item out"""
+    if client is None:
+        return True
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.exists(f"{key}:ready")
+        pipe.execute_command("BF.EXISTS", key, item)
+        filter_ready, present = pipe.execute()
+        return not filter_ready or bool(present)
+    except Exception:
+        return True
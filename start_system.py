@@ -11,28 +11,37 @@ import sys
 import time
 import signal
 import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Global state for managing processes
 PROCESSES = []
 
+# Seconds to wait for a service's health endpoint to answer
+STARTUP_TIMEOUT = 15
+
 # Service configuration
 SERVICES = [
     {
         'name': 'User Validator API',
         'script': 'apis/user_validator.py',
+        'module': 'apis.user_validator',
         'port': 8000,
         'health_endpoint': 'http://localhost:8000/'
     },
     {
         'name': 'Mail Service API',
-        'script': 'apis/mail_service.py', 
+        'script': 'apis/mail_service.py',
+        'module': 'apis.mail_service',
         'port': 8001,
         'health_endpoint': 'http://localhost:8001/'
     },
     {
         'name': 'Fulfillment API',
         'script': 'apis/fulfillment_api.py',
+        'module': 'apis.fulfillment_api',
         'port': 8002,
         'health_endpoint': 'http://localhost:8002/'
     }
@@ -65,6 +74,22 @@ def check_prerequisites():
     print("✅ All prerequisites met!")
     return True
 
+def wait_until_ready(process, url, timeout=STARTUP_TIMEOUT):
+    """Poll a service endpoint until it answers; False if the process exits or time runs out"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            urllib.request.urlopen(url, timeout=0.5).close()
+            return True
+        except urllib.error.HTTPError:
+            # Any HTTP status means the server is accepting requests
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
 def start_service(service):
     """Start a single service"""
     global PROCESSES
@@ -72,7 +97,7 @@ def start_service(service):
     
     try:
         process = subprocess.Popen(
-            [sys.executable, service['script']],
+            [sys.executable, '-m', service['module']],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True
@@ -84,13 +109,13 @@ def start_service(service):
             'port': service['port']
         })
         
-        # Give the service a moment to start
-        time.sleep(2)
-        
-        # Check if process is still running
-        if process.poll() is None:
+        # Wait for the service to answer HTTP instead of a fixed delay
+        if wait_until_ready(process, service['health_endpoint']):
             print(f"✅ {service['name']} started successfully")
             return True
+        elif process.poll() is None:
+            print(f"❌ {service['name']} did not respond within {STARTUP_TIMEOUT} seconds")
+            return False
         else:
             stdout, stderr = process.communicate()
             print(f"❌ {service['name']} failed to start")
@@ -105,9 +130,13 @@ def start_all_services():
     """Start all API services"""
     print("\n🔄 Starting API services...")
     
+    # Services start independently, so launch them together and wait for all of them
+    with ThreadPoolExecutor(max_workers=len(SERVICES)) as executor:
+        results = list(executor.map(start_service, SERVICES))
+    
     success_count = 0
-    for service in SERVICES:
-        if start_service(service):
+    for service, started in zip(SERVICES, results):
+        if started:
             success_count += 1
         else:
             print(f"⚠️  Failed to start {service['name']}")
@@ -127,13 +156,11 @@ def start_mail_monitor():
     print("\n🚀 Starting Mail Monitor (main system)...")
     
     try:
+        # The monitor writes straight to this terminal through the inherited stdout
         process = subprocess.Popen(
             [sys.executable, 'mail_monitor.py'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
+            stdout=None,
+            stderr=subprocess.STDOUT
         )
         
         PROCESSES.append({
@@ -148,11 +175,9 @@ def start_mail_monitor():
         print("🎯 SYSTEM READY - AI Insurance Claim Processing Active")
         print("="*60)
         
-        # Stream output from mail monitor
+        # Run until the mail monitor exits
         try:
-            for line in iter(process.stdout.readline, ''):
-                if line:
-                    print(line.rstrip())
+            process.wait()
                     
         except KeyboardInterrupt:
             print("\n🛑 Received interrupt signal...")
@@ -235,9 +260,6 @@ def run():
     show_status()
     
     # Start mail monitor (this will run indefinitely)
-    print("\n⏰ Waiting 5 seconds for all services to stabilize...")
-    time.sleep(5)
-    
     try:
         start_mail_monitor()
     except KeyboardInterrupt: